@@ -1,9 +1,15 @@
 import os
 from dotenv import load_dotenv
 import logging
+import logging.handlers
+import atexit
 
-# Load environment variables from the .env file
-load_dotenv()
+# Name of the flag set by the GUI when it starts its worker with an already loaded environment
+CONFIG_CACHED_FLAG = "ULTRASTAR_CONFIG_CACHED"
+
+# Load environment variables from the .env file, unless the parent process already did it
+if os.getenv(CONFIG_CACHED_FLAG) != "1":
+    load_dotenv()
 
 # global configuration variables
 APP_TITLE = os.getenv("APP_TITLE", "UltraStar Generator")
@@ -27,6 +33,11 @@ WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "cuda")
 WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "float32")
 WHISPER_MIN_GAP_SILENCE = float(os.getenv("WHISPER_MIN_GAP_SILENCE", "0.5"))
 
+# Pitch detection backend: "crepe" (default) or "swiftf0" (faster, requires swift-f0)
+PITCH_BACKEND = os.getenv("PITCH_BACKEND", "crepe").lower()
+# Number of processes computing pitch caches in parallel in batch mode (each loads its own model)
+PITCH_WORKERS = max(1, int(os.getenv("PITCH_WORKERS", "2")))
+
 # Configuration for Spleeter
 SPLEETER = os.getenv("SPLEETER", "false").lower() == "true"
 SPLEETER_MODEL = os.getenv("SPLEETER_MODEL", "htdemucs")
@@ -39,11 +50,11 @@ MUSIC_GENRE_PICTURE = os.environ.get("MUSIC_GENRE_PICTURE", "")
 API_BASE = MUSIC_API_HOST + MUSIC_API_KEY + "/"
 
 # Define the maximum number of words per phrase before forcing an automatic pause
-MAX_WORDS_PER_PHRASE = os.environ.get("MAX_WORDS_PER_PHRASE", 7)
+MAX_WORDS_PER_PHRASE = int(os.environ.get("MAX_WORDS_PER_PHRASE", "7"))
 # Define the minimum gap (in beats) between the end of one phrase and the start of the next
-GAP_THRESHOLD = os.environ.get("GAP_THRESHOLD", 4)
+GAP_THRESHOLD = int(os.environ.get("GAP_THRESHOLD", "4"))
 # Define the fraction of the gap where the end-of-phrase marker will be inserted (25% into the gap)
-FRACTION = os.environ.get("FRACTION", 0.25)
+FRACTION = float(os.environ.get("FRACTION", "0.25"))
 
 
 class ColoredFormatter(logging.Formatter):
@@ -89,7 +100,10 @@ logger.addHandler(console_handler)
 
 # Création d'un handler pour le fichier de log
 file_handler = logging.FileHandler(LOG_FILE)
-formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
-logger.addHandler(file_handler)
+file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+# Les écritures dans le fichier sont regroupées : vidées tous les 1024 messages, sur erreur ou à la sortie
+file_buffer_handler = logging.handlers.MemoryHandler(1024, flushLevel=logging.ERROR, target=file_handler)
+logger.addHandler(file_buffer_handler)
+atexit.register(file_buffer_handler.flush)
 
 
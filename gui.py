@@ -1,64 +1,240 @@
+import io
+import multiprocessing
+import os
+import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter.scrolledtext import ScrolledText
-import subprocess
 import threading
 import queue
 
 # Import configuration variables from your config module (which loads .env)
-from config import APP_TITLE, APP_VERSION
-from mp3 import fill_artist_title
+# The heavy modules (mp3, main) are imported where used: the pitch workers spawned in
+# batch mode re-import this module as their main module.
+from config import APP_TITLE, APP_VERSION, CONFIG_CACHED_FLAG, console_handler, file_buffer_handler
 
-# Global queue to transfer subprocess output safely to the GUI
+# Global queue to transfer worker output safely to the GUI
 output_queue = queue.Queue()
+# Maximum number of queued chunks inserted in the console in a single drain
+MAX_DRAIN_LINES = 10_000
+# Console trimming: beyond MAX_CONSOLE_LINES, only the last KEPT_CONSOLE_LINES are kept
+MAX_CONSOLE_LINES = 5000
+KEPT_CONSOLE_LINES = 4000
+console_line_count = 0
+# Callbacks to run on the main thread once a task has terminated
+process_done_callbacks = queue.Queue()
+# Callbacks of the tasks submitted to the current worker, in submission order (created by start_worker)
+task_callbacks = None
+# Worker process and the queues used to talk to it (created by start_worker)
+worker = None
+task_queue = None
+worker_output_queue = None
+# Delay between two checks that the worker is still alive while waiting for its output
+WORKER_POLL_SECONDS = 1
+# Delay given to the worker to stop by itself when the window is closed
+WORKER_STOP_SECONDS = 5
 
 def append_to_console(text):
     """
     Append text to the console widget in a thread-safe way.
     """
+    global console_line_count
     console_text.config(state=tk.NORMAL)
     console_text.insert(tk.END, text)
+    console_line_count += text.count("\n")
+    # Trim the oldest lines so the widget memory stays bounded on long batch runs
+    if console_line_count > MAX_CONSOLE_LINES:
+        trimmed = console_line_count - KEPT_CONSOLE_LINES
+        console_text.delete("1.0", f"{trimmed + 1}.0")
+        console_line_count = KEPT_CONSOLE_LINES
     console_text.see(tk.END)
     console_text.config(state=tk.DISABLED)
 
-def poll_output_queue():
+def drain_output_queue(event=None):
     """
-    Poll the output queue and update the console widget.
+    Drain every pending item of the output queue into the console widget.
+    Bound to the <<ConsoleOutput>> virtual event generated by forward_worker_output.
     """
-    while not output_queue.empty():
-        line = output_queue.get()
-        append_to_console(line)
-    root.after(100, poll_output_queue)
+    lines = []
+    try:
+        while True:
+            lines.append(output_queue.get_nowait())
+    except queue.Empty:
+        pass
+    if not lines:
+        return
+    # Keep only the most recent lines of a pathological backlog
+    if len(lines) > MAX_DRAIN_LINES:
+        lines = lines[-MAX_DRAIN_LINES:]
+    # A single insert per drain instead of one widget update per line
+    append_to_console("".join(lines))
+
+class _QueueWriter(io.TextIOBase):
+    """
+    Text stream sending everything written to it to a multiprocessing queue.
+    Used as stdout/stderr in the worker process.
+    
+    Progress bars and log handlers of the libraries check isatty() or encoding:
+    the stream reports itself as a UTF-8, non-interactive, writable stream.
+    """
+    encoding = "utf-8"
+    errors = "replace"
+
+    def __init__(self, target_queue):
+        super().__init__()
+        self.target_queue = target_queue
+
+    def write(self, text):
+        if text:
+            self.target_queue.put(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+    def writable(self):
+        return True
+
+def _worker_main(tasks, outputs):
+    """
+    Entry point of the worker process.
+    
+    The heavy modules (WhisperX, Demucs, librosa, torch...) are imported once, then
+    each task sent by the GUI runs in this same interpreter, reusing the cached models.
+    A task is None to stop the worker, an empty tuple for Batch Mode, or (mp3_path,)
+    for Single MP3 Mode. Text output is sent as str, the end of a task as its int return code.
+    """
+    # Exiting must not wait for the GUI to read the remaining output
+    outputs.cancel_join_thread()
+    sys.stdout = sys.stderr = _QueueWriter(outputs)
+    # The console log handler was bound to the original stderr when config was imported
+    console_handler.setStream(sys.stderr)
+    import main as app
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        retcode = 0
+        try:
+            if task:
+                app.single_mp3_mode(task[0])
+            else:
+                app.batch_mode()
+        except SystemExit as e:
+            retcode = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            print(f"Error: {e}")
+            retcode = 1
+        # atexit handlers do not run in a multiprocessing child: flush the log file after each task
+        file_buffer_handler.flush()
+        outputs.put(retcode)
+
+def start_worker():
+    """
+    Start the worker process and the thread forwarding its output to the console.
+    """
+    global worker, task_queue, worker_output_queue, task_callbacks
+    # The .env file is already loaded in os.environ: a spawned worker skips parsing it again
+    os.environ[CONFIG_CACHED_FLAG] = "1"
+    task_queue = multiprocessing.Queue()
+    worker_output_queue = multiprocessing.Queue()
+    # Each worker has its own callbacks: those of a dead worker are never paired with new tasks
+    task_callbacks = queue.Queue()
+    # Not a daemon: batch mode starts its own pool of pitch detection processes
+    worker = multiprocessing.Process(target=_worker_main, args=(task_queue, worker_output_queue))
+    worker.start()
+    threading.Thread(target=forward_worker_output, args=(worker, worker_output_queue, task_callbacks), daemon=True).start()
+
+def forward_worker_output(process, outputs, callbacks):
+    """
+    Forward the worker output to the console queue and signal the end of each task.
+    Runs in a background thread, until the worker process is dead.
+    
+    A worker killed during a task (crash, out of memory...) never sends its return code:
+    its pending tasks are then terminated with the exit code of the process.
+    """
+    while True:
+        try:
+            item = outputs.get(timeout=WORKER_POLL_SECONDS)
+        except queue.Empty:
+            if process.is_alive():
+                continue
+            fail_pending_tasks(process, callbacks)
+            return
+        if isinstance(item, int):
+            try:
+                callback = callbacks.get_nowait()
+            except queue.Empty:
+                callback = None
+            signal_task_end(item, callback)
+        else:
+            output_queue.put(item)
+            # Wake up the Tk main loop only when there is something to display
+            notify_main_loop("<<ConsoleOutput>>")
+
+def signal_task_end(retcode, callback):
+    """
+    Display the return code of a terminated task and schedule its callback on the main thread.
+    """
+    output_queue.put(f"\nProcess terminated with return code: {retcode}\n")
+    notify_main_loop("<<ConsoleOutput>>")
+    if callback:
+        process_done_callbacks.put(callback)
+        notify_main_loop("<<ProcessDone>>")
 
-def execute_command(cmd_list, callback=None):
+def notify_main_loop(event):
     """
-    Execute a command by launching main.py in a subprocess and redirect its output.
-    An optional callback is executed on the main thread when the process terminates.
+    Generate a virtual event for the Tk main loop.
+    
+    Once the window is closed, the event is dropped: the forwarding thread keeps
+    draining the worker output, so the worker never blocks on a full pipe.
     """
     try:
-        process = subprocess.Popen(cmd_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-    except Exception as e:
-        append_to_console(f"Error starting process: {e}\n")
-        if callback:
-            root.after(0, callback)
-        return
+        root.event_generate(event, when="tail")
+    except (tk.TclError, RuntimeError):
+        pass
 
-    def enqueue_output(pipe):
-        for line in iter(pipe.readline, ''):
-            output_queue.put(line)
-        pipe.close()
+def fail_pending_tasks(process, callbacks):
+    """
+    Terminate the tasks still pending on a dead worker, with its exit code as return code.
+    Called by the forwarding thread or on restart, each callback is only taken once.
+    """
+    while True:
+        try:
+            callback = callbacks.get_nowait()
+        except queue.Empty:
+            return
+        retcode = process.exitcode if process.exitcode else 1
+        output_queue.put(f"\nWorker process stopped (exit code {process.exitcode})\n")
+        signal_task_end(retcode, callback)
 
-    # Start threads to capture stdout and stderr
-    threading.Thread(target=enqueue_output, args=(process.stdout,), daemon=True).start()
-    threading.Thread(target=enqueue_output, args=(process.stderr,), daemon=True).start()
+def submit_task(task, callback=None):
+    """
+    Send a task to the worker process, restarting it if it died.
+    An optional callback is executed on the main thread when the task terminates.
+    """
+    if not worker.is_alive():
+        append_to_console(f"Worker process stopped (exit code {worker.exitcode}), restarting it...\n")
+        fail_pending_tasks(worker, task_callbacks)
+        start_worker()
+    task_callbacks.put(callback)
+    task_queue.put(task)
 
-    # New thread to wait for process termination and notify via the console and callback
-    def wait_for_process():
-        retcode = process.wait()  # Wait until the process finishes
-        output_queue.put(f"\nProcess terminated with return code: {retcode}\n")
-        if callback:
-            root.after(0, callback)
-    threading.Thread(target=wait_for_process, daemon=True).start()
+def run_process_done_callbacks(event=None):
+    """
+    Run the pending termination callbacks on the main thread.
+    Bound to the <<ProcessDone>> virtual event generated by forward_worker_output.
+    """
+    while True:
+        try:
+            callback = process_done_callbacks.get_nowait()
+        except queue.Empty:
+            break
+        callback()
 
 def disable_ui():
     """
@@ -86,14 +262,14 @@ def run_batch_mode():
     """
     append_to_console("Launching Batch Mode...\n")
     disable_ui()  # Disable buttons and show working message
-    execute_command(["python", "main.py"], callback=enable_ui)
+    submit_task((), callback=enable_ui)
 
 def run_single_mp3_mode():
     """
     Launch the application in Single MP3 Mode by asking the user to select a file.
     If artist or title tags are missing, they are requested via a dialog box.
     """
-    from mp3 import read_tags
+    from mp3 import fill_artist_title, read_tags
     
     file_path = filedialog.askopenfilename(
         title="Select MP3 File",
@@ -125,7 +301,7 @@ def run_single_mp3_mode():
     
     append_to_console(f"Launching Single MP3 Mode with file: {file_path}\n")
     disable_ui()  # Disable UI and show working message
-    execute_command(["python", "main.py", file_path], callback=enable_ui)
+    submit_task((file_path,), callback=enable_ui)
 
 def main():
     """
@@ -171,14 +347,42 @@ def main():
     single_mp3_button = tk.Button(button_frame, text="Single MP3 Mode", width=15, command=run_single_mp3_mode)
     single_mp3_button.grid(row=0, column=1, padx=10)
     
-    # Console widget to display subprocess output
+    # Console widget to display worker output
     console_text = ScrolledText(root, height=20, state=tk.DISABLED)
     console_text.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
     
-    # Start polling for output from subprocess
-    root.after(100, poll_output_queue)
+    # Refresh the console only when worker output or task termination is signaled
+    root.bind("<<ConsoleOutput>>", drain_output_queue)
+    root.bind("<<ProcessDone>>", run_process_done_callbacks)
+    
+    # Start the worker once the events forwarding its output can be handled
+    start_worker()
     
+    root.protocol("WM_DELETE_WINDOW", close_window)
     root.mainloop()
+    stop_worker()
+
+def close_window():
+    """
+    Close the window, asking for confirmation when a task is still running.
+    """
+    if not task_callbacks.empty() and worker.is_alive():
+        if not messagebox.askokcancel("Quit", "A task is still running. Stop it and quit?"):
+            return
+    root.destroy()
+
+def stop_worker():
+    """
+    Stop the worker process once the window is closed.
+    
+    An idle worker stops by itself; a worker still running a task is terminated,
+    so that no invisible GUI process waits for the end of a batch.
+    """
+    task_queue.put(None)
+    worker.join(WORKER_STOP_SECONDS)
+    if worker.is_alive():
+        worker.terminate()
+        worker.join()
 
 if __name__ == "__main__":
     main()
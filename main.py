@@ -1,69 +1,153 @@
 import sys
 import os
 import json
-from config import logger
-from ultrastar import process_song
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from config import OUTPUT_FOLDER, PITCH_WORKERS, SPLEETER, SPLEETER_MODEL, logger
+from pitcher import init_pitch_worker, prepare_pitch_cache, word_pitch_cache_path
 
-def main():
-    arg_count = len(sys.argv)
+# Number of threads fetching music metadata in batch mode
+METADATA_WORKERS = 8
+
+def batch_mode():
+    """
+    Batch Mode: processes every song listed in songs.json.
+    """
+    # Imported here rather than at module level: the spawned pitch workers re-import
+    # this module and must not load WhisperX, Demucs and torch for nothing.
+    from mp3 import get_music_info, separated_stems_folder, spleet_batch
+    from ultrastar import generate_unique_id, process_song
     
-    # ---------------------------
-    # Batch Mode: No extra arguments.
-    # ---------------------------
-    if arg_count == 1:
-        # In batch mode, the song list is read from a JSON file.
-        songs_filepath = "./songs.json"
-        if not os.path.isfile(songs_filepath):
-            logger.error(f"File {songs_filepath} not found.")
-            sys.exit(1)
+    # In batch mode, the song list is read from a JSON file.
+    songs_filepath = "./songs.json"
+    if not os.path.isfile(songs_filepath):
+        logger.error(f"File {songs_filepath} not found.")
+        sys.exit(1)
+    try:
+        # Open and load the songs list from the JSON file.
+        with open(songs_filepath, "r", encoding="utf-8") as file:
+            songs_list = json.load(file)
+    except Exception as error:
+        logger.error(f"Error reading {songs_filepath}: {error}")
+        sys.exit(1)
+    
+    # Validate each song in the list before processing.
+    valid_songs = []
+    for song in songs_list:
+        artist = song.get("artist")
+        title = song.get("title")
+        language = song.get("language")
+        mp3_path = song.get("file")
+        logger.debug(f"Song: {artist} - {title}")
+        logger.debug(f"Language: {language}")
+        logger.debug(f"MP3 file: {mp3_path}")
+        
+        # Both artist and title are mandatory for processing.
+        if not artist or not title:
+            logger.error("Invalid song: 'artist' and 'title' are required.")
+            continue
+        
+        if not mp3_path or not os.path.isfile(mp3_path):
+            logger.error(f"MP3 file not found for {artist} - {title}.")
+            # Skip to the next song.
+            continue
+        valid_songs.append((mp3_path, artist, title, language))
+    
+    # Prefetch music metadata in the background: the API latency overlaps with
+    # separation and transcription, and each Song then reads it from the cache.
+    executor = ThreadPoolExecutor(max_workers=METADATA_WORKERS)
+    metadata_futures = {
+        mp3_path: executor.submit(get_music_info, artist, title, generate_unique_id(artist, title))
+        for mp3_path, artist, title, _ in valid_songs
+    }
+    
+    # Separate vocals of the whole batch in a single Demucs run (model loaded once).
+    # Songs whose stems are missing afterwards (or sharing their file name with another
+    # song) are separated one by one in process_song.
+    if SPLEETER and valid_songs:
         try:
-            # Open and load the songs list from the JSON file.
-            with open(songs_filepath, "r", encoding="utf-8") as file:
-                songs_list = json.load(file)
+            spleet_batch([mp3_path for mp3_path, _, _, _ in valid_songs], SPLEETER_MODEL, OUTPUT_FOLDER)
         except Exception as error:
-            logger.error(f"Error reading {songs_filepath}: {error}")
-            sys.exit(1)
-        
-        # Process each song in the list.
-        for song in songs_list:
-            artist = song.get("artist")
-            title = song.get("title")
-            language = song.get("language")
-            mp3_path = song.get("file")
-            logger.debug(f"Song: {artist} - {title}")
-            logger.debug(f"Language: {language}")
-            logger.debug(f"MP3 file: {mp3_path}")
-            
-            # Both artist and title are mandatory for processing.
-            if not artist or not title:
-                logger.error("Invalid song: 'artist' and 'title' are required.")
+            logger.error(f"Error separating vocals in batch: {error}")
+    
+    # Compute the pitch caches of all the songs in parallel processes, while the songs are
+    # transcribed one by one below. process_pitch then finds each cache ready on disk.
+    pitch_executor = None
+    pitch_futures = {}
+    try:
+        # TensorFlow (CREPE) logs are silenced in the workers, which inherit the environment
+        os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+        pitch_executor = ProcessPoolExecutor(max_workers=PITCH_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=init_pitch_worker)
+        for mp3_path, artist, title, _ in valid_songs:
+            uid = generate_unique_id(artist, title)
+            # Songs already mapped to pitches never read the pitch cache again
+            if os.path.exists(word_pitch_cache_path(uid)):
                 continue
-            
+            audio_file = mp3_path
+            if SPLEETER:
+                stems_folder = separated_stems_folder(mp3_path, SPLEETER_MODEL, OUTPUT_FOLDER)
+                # The cache is keyed by song: never compute it from the full mix when the
+                # vocals are missing, process_song separates the song again and pitches the vocals.
+                if not stems_folder:
+                    continue
+                audio_file = os.path.join(stems_folder, "vocals.mp3")
+            pitch_futures[mp3_path] = pitch_executor.submit(prepare_pitch_cache, audio_file, uid)
+    except Exception as error:
+        logger.error(f"Error starting pitch detection workers: {error}")
+    
+    try:
+        # Process each song in the list.
+        for mp3_path, artist, title, language in valid_songs:
             logger.debug(f"Processing song: {artist} - {title}")
-            
-            if not mp3_path or not os.path.isfile(mp3_path):
-                logger.error(f"MP3 file not found for {artist} - {title}.")
-                # Skip to the next song.
-                continue
-            else:
-                # Process the song: this function generates the UltraStar file.
-                process_song(mp3_path, artist, title, language)
-                # remove temp mp3 file
+            # Wait for the metadata of this song so its cache file is complete.
+            try:
+                metadata_futures[mp3_path].result()
+            except Exception as error:
+                logger.error(f"Error prefetching music info for {artist} - {title}: {error}")
+            # Wait for the pitch cache of this song; on error, process_pitch computes it itself.
+            if mp3_path in pitch_futures:
                 try:
-                    os.remove(mp3_path)
+                    pitch_futures[mp3_path].result()
                 except Exception as error:
-                    logger.error(f"Error removing {mp3_path}: {error}")
+                    logger.error(f"Error computing pitch for {artist} - {title}: {error}")
+            # Process the song: this function generates the UltraStar file.
+            process_song(mp3_path, artist, title, language)
+            # remove temp mp3 file
+            try:
+                os.remove(mp3_path)
+            except Exception as error:
+                logger.error(f"Error removing {mp3_path}: {error}")
+    finally:
+        # Also on error: pending prefetches are cancelled and the pitch processes stop
+        executor.shutdown(cancel_futures=True)
+        if pitch_executor:
+            pitch_executor.shutdown(cancel_futures=True)
+
+def single_mp3_mode(mp3_path):
+    """
+    Single MP3 Mode: processes the given MP3 file, artist and title being read from its tags.
+    """
+    if not os.path.isfile(mp3_path):
+        logger.error(f"MP3 file not found: {mp3_path}")
+        sys.exit(1)
+    from ultrastar import process_song
+    process_song(mp3_path)
+
+def main():
+    arg_count = len(sys.argv)
+    
+    # ---------------------------
+    # Batch Mode: No extra arguments.
+    # ---------------------------
+    if arg_count == 1:
+        batch_mode()
     
     # ---------------------------
     # Single MP3 Mode: One argument provided.
     # ---------------------------
     elif arg_count == 2:
         # The user provided the full path to a single MP3 file.
-        mp3_path = sys.argv[1]
-        if not os.path.isfile(mp3_path):
-            logger.error(f"MP3 file not found: {mp3_path}")
-            sys.exit(1)
-        process_song(mp3_path)
+        single_mp3_mode(sys.argv[1])
         
     # ---------------------------
     # Incorrect Usage
@@ -1,12 +1,16 @@
 import os
-import shlex
+import shutil
 import subprocess
-import json
+import tempfile
+from functools import lru_cache
 import librosa
+import numpy as np
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from mutagen.easyid3 import EasyID3
 from mutagen.id3 import ID3, APIC, ID3NoHeaderError
-from mutagen import File as MutagenFile
+from mutagen.mp3 import MP3, HeaderNotFoundError
 import demucs.separate
 import whisperx
 from config import CACHE_FOLDER, MUSIC_API_KEY, WHISPER_ALIGN, WHISPER_BATCH_SIZE, WHISPER_COMPUTE_TYPE, WHISPER_DEVICE, WHISPER_MODEL, logger, API_BASE, debug
@@ -63,6 +67,21 @@ def save_tags(mp3_path: str, tags) -> None:
     """
     tags.save(mp3_path)
 
+@lru_cache(maxsize=32)
+def _apic_bytes(mp3_path: str, mtime: float):
+    """
+    Returns the data of the first APIC (or legacy PIC) frame of the MP3 file, or None.
+    
+    Cached by (path, modification time) so the ID3 tags are parsed once per file version.
+    """
+    try:
+        tags = ID3(mp3_path)
+    except ID3NoHeaderError:
+        return None
+    # Index the 'APIC' frames (or legacy 'PIC') which contain image data directly.
+    frames = tags.getall("APIC") or tags.getall("PIC")
+    return frames[0].data if frames else None
+
 def extract_image(mp3_path: str, image_path: str) -> bool:
     """
     Extracts the cover image from an MP3 file and saves it to image_path.
@@ -80,14 +99,11 @@ def extract_image(mp3_path: str, image_path: str) -> bool:
         bool: True if an image was extracted and saved successfully; False otherwise.
     """
     try:
-        audio = MutagenFile(mp3_path, easy=False)
-        if audio is not None and audio.tags is not None:
-            # Look for frames with ID 'APIC' (or legacy 'PIC') which contain image data.
-            apic_frames = [tag for tag in audio.tags.values() if getattr(tag, 'FrameID', '') in ('APIC', 'PIC')]
-            if apic_frames:
-                with open(image_path, "wb") as f:
-                    f.write(apic_frames[0].data)
-                return True
+        data = _apic_bytes(mp3_path, os.path.getmtime(mp3_path))
+        if data:
+            with open(image_path, "wb") as f:
+                f.write(data)
+            return True
         return False
     except Exception:
         return False
@@ -99,10 +115,8 @@ def fill_artist_title(mp3_file, artist, title):
     try:
         audio = EasyID3(mp3_file)
     except ID3NoHeaderError:
-        # If the file doesn't have ID3 tags, create them
+        # If the file doesn't have ID3 tags, create them (written by the save below)
         audio = EasyID3()
-        audio.save(mp3_file)
-        audio = EasyID3(mp3_file)
     
     # Update the tags
     audio['artist'] = artist
@@ -112,6 +126,10 @@ def fill_artist_title(mp3_file, artist, title):
 # =============================================================================
 # Audio Analysis Functions
 # =============================================================================
+# Sample rate and hop length used to decode the audio for BPM detection
+BPM_SAMPLE_RATE = 8000
+BPM_HOP_LENGTH = 192
+
 def detect_bpm(mp3_path: str) -> int:
     """
     Detects the BPM (beats per minute) of the given mp3 file.
@@ -128,8 +146,12 @@ def detect_bpm(mp3_path: str) -> int:
     Returns:
         int: The detected BPM (rounded to the nearest integer).
     """
-    y, sr = librosa.load(mp3_path)
-    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
+    # Beat tracking does not need the full bandwidth: decode mono at a low sample rate.
+    # The hop length keeps frames around 24 ms, close to librosa's default resolution.
+    y, sr = librosa.load(mp3_path, sr=BPM_SAMPLE_RATE, mono=True)
+    # Contiguous float32 samples let the onset-strength FFTs use vectorized code paths
+    y = np.ascontiguousarray(y, dtype=np.float32)
+    tempo, _ = librosa.beat.beat_track(y=y, sr=sr, hop_length=BPM_HOP_LENGTH)
 
     return int(tempo[0]) 
 
@@ -137,7 +159,8 @@ def get_duration(mp3_path: str = "") -> float:
     """
     Retrieves the duration of the mp3 file in seconds.
     
-    Uses ffmpeg to probe the mp3 file and extract the 'duration' property.
+    Reads the duration from the mp3 headers with Mutagen, in-process.
+    ffmpeg is only used as a fallback when no valid MPEG frame header is found.
     
     Args:
         mp3_path (str): Path to the mp3 file.
@@ -145,12 +168,140 @@ def get_duration(mp3_path: str = "") -> float:
     Returns:
         float: Duration of the mp3 in seconds.
     """
-    import ffmpeg
     if not mp3_path or not os.path.exists(mp3_path):
         return 0
+    try:
+        return float(MP3(mp3_path).info.length)
+    except HeaderNotFoundError:
+        logger.debug(f"No MPEG header found, probing duration with ffmpeg: {mp3_path}")
+    import ffmpeg
     duration = ffmpeg.probe(mp3_path)['format']['duration']
     return float(duration)
 
+def get_audio_metadata(mp3_path: str, cache_id: str) -> tuple:
+    """
+    Retrieves the BPM and duration of the mp3 file, using a JSON cache.
+
+    Beat tracking decodes the whole song, so the results are stored in
+    'meta_<cache_id>.json' together with the mtime of the mp3 file.
+    The cache is ignored when the mp3 file has been modified since.
+
+    Args:
+        mp3_path (str): Path to the mp3 file.
+        cache_id (str): Unique identifier used to name the cache file.
+
+    Returns:
+        tuple: (bpm, duration) as returned by detect_bpm and get_duration.
+    """
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    cache_file = os.path.join(CACHE_FOLDER, f"meta_{cache_id}.json")
+    mtime = os.path.getmtime(mp3_path)
+
+    cached = _read_json_cache(cache_file)
+    if cached and cached.get("mtime") == mtime:
+        logger.debug(f"Audio metadata loaded from cache: {cache_file}")
+        return cached["bpm"], cached["duration"]
+
+    bpm = detect_bpm(mp3_path)
+    duration = get_duration(mp3_path)
+    _write_json_cache(cache_file, {"mtime": mtime, "bpm": bpm, "duration": duration})
+    return bpm, duration
+
+def _spleet_model(model: str) -> str:
+    """
+    Returns the Demucs model actually used for separation.
+    
+    In debug mode, the model is downgraded to the faster 'htdemucs'.
+    """
+    return "htdemucs" if debug else model
+
+def spleet_output_folder(mp3_path: str, model: str = "htdemucs_ft", out_dir: str = None) -> str:
+    """
+    Returns the folder where Demucs stores the separated stems of the given mp3 file.
+    
+    Args:
+        mp3_path (str): Path to the original mp3 file.
+        model (str): The Demucs model used.
+        out_dir (str): The directory given to Demucs as output.
+        
+    Returns:
+        str: Path to the folder containing vocals.mp3 and no_vocals.mp3.
+    """
+    if out_dir is None:
+        out_dir = os.path.dirname(os.path.abspath(mp3_path))
+    base_name = os.path.splitext(os.path.basename(mp3_path))[0]
+    return os.path.join(out_dir, _spleet_model(model), base_name)
+
+# Stem folders separated by spleet_batch in this process, by absolute path of their source mp3
+_SEPARATED_STEMS = {}
+
+def spleet_batch(mp3_paths: list, model: str = "htdemucs_ft", out_dir: str = None) -> list:
+    """
+    Separates vocals from the instrumental parts of several mp3 files in a single Demucs run.
+    
+    The Demucs model is loaded once for the whole list instead of once per file.
+    Demucs names its output folders after the mp3 file names: files sharing the same
+    name (in different folders) would overwrite each other, so they are left out and
+    must be separated one by one, right before being used.
+    
+    Args:
+        mp3_paths (list): Paths to the original mp3 files.
+        model (str): The Demucs model to use.
+        out_dir (str): The directory where output files will be stored
+                       (defaults to the directory of the first mp3 file).
+        
+    Returns:
+        list: Paths to the output folders containing the separated stems, in the same order
+              (None for the files left out).
+    """
+    if not mp3_paths:
+        return []
+    if out_dir is None:
+        out_dir = os.path.dirname(os.path.abspath(mp3_paths[0]))
+    folders = [spleet_output_folder(mp3_path, model, out_dir) for mp3_path in mp3_paths]
+    unique_paths = [mp3_path for mp3_path, folder in zip(mp3_paths, folders) if folders.count(folder) == 1]
+    if len(unique_paths) < len(mp3_paths):
+        logger.warning("Some mp3 files share the same name: they will be separated one by one")
+    if not unique_paths:
+        return [None] * len(mp3_paths)
+    if debug:
+        logger.warning(f"model downgrade to 'htdemucs' for spleet")
+    # "--mp3" outputs mp3 files, "--two-stems vocals" separates vocals from non-vocals.
+    args = ["--mp3", "--two-stems", "vocals", "-n", _spleet_model(model), "--out", out_dir, *unique_paths]
+    logger.debug(f"Executing Demucs with arguments: {args}")
+    demucs.separate.main(args)
+    for mp3_path in unique_paths:
+        _SEPARATED_STEMS[os.path.abspath(mp3_path)] = spleet_output_folder(mp3_path, model, out_dir)
+    return [folder if mp3_path in unique_paths else None for mp3_path, folder in zip(mp3_paths, folders)]
+
+def separated_stems_folder(mp3_path: str, model: str = "htdemucs_ft", out_dir: str = None) -> str:
+    """
+    Returns the folder of the stems separated from the given mp3 file by spleet_batch,
+    if they can be reused.
+    
+    Stems are only reused when this process separated them from this very file, and
+    when they are newer than it: stems left by an aborted run, or separated from another
+    file with the same name, are never mistaken for the song's own stems.
+    
+    Args:
+        mp3_path (str): Path to the original mp3 file.
+        model (str): The Demucs model used.
+        out_dir (str): The directory given to Demucs as output.
+        
+    Returns:
+        str: Path to the folder containing vocals.mp3 and no_vocals.mp3, or None.
+    """
+    folder = spleet_output_folder(mp3_path, model, out_dir)
+    if _SEPARATED_STEMS.get(os.path.abspath(mp3_path)) != folder:
+        return None
+    try:
+        source_mtime = os.path.getmtime(mp3_path)
+        if all(os.path.getmtime(os.path.join(folder, stem)) >= source_mtime for stem in ("vocals.mp3", "no_vocals.mp3")):
+            return folder
+    except FileNotFoundError:
+        pass
+    return None
+
 def spleet(mp3_path: str, model: str = "htdemucs_ft", out_dir: str = None) -> str:
     """
     Separates vocals from the instrumental parts in the mp3 file using Demucs.
@@ -166,26 +317,135 @@ def spleet(mp3_path: str, model: str = "htdemucs_ft", out_dir: str = None) -> st
     Returns:
         str: Path to the output folder containing the separated stems.
     """
-    if debug:
-        logger.warning(f"model downgrade to 'htdemucs' for spleet")
-        model = "htdemucs"
-        
     if out_dir is None:
         out_dir = os.path.dirname(os.path.abspath(mp3_path))
-    # Construct the command-line arguments for Demucs.
-    # The command uses "--mp3" to output mp3 files, "--two-stems vocals" to separate vocals from non-vocals.
-    demucs_cmd = f'--mp3 --two-stems vocals -n "{model}" --out "{out_dir}" "{mp3_path}"'
-    logger.debug(f"Demucs command: {demucs_cmd}")
-    args = shlex.split(demucs_cmd)
-    logger.debug(f"Executing Demucs with arguments: {args}")
-    demucs.separate.main(args)
-    base_name = os.path.splitext(os.path.basename(mp3_path))[0]
-    output_folder = os.path.join(out_dir, model, base_name)
-    return output_folder
+    return spleet_batch([mp3_path], model, out_dir)[0]
 
 # =============================================================================
 # Music API and Cache Functions
 # =============================================================================
+def _read_json_cache(cache_file: str):
+    """
+    Loads a JSON cache file with orjson (files written with indentation by older
+    versions are still valid JSON and load the same way).
+    
+    A corrupt file (e.g. truncated by a crash) is removed so the data is fetched again.
+    
+    Args:
+        cache_file (str): Path to the cache file.
+        
+    Returns:
+        The cached data, or None if the file is missing or corrupt.
+    """
+    try:
+        with open(cache_file, "rb") as file:
+            return orjson.loads(file.read())
+    except FileNotFoundError:
+        return None
+    except orjson.JSONDecodeError as e:
+        logger.warning(f"Corrupt cache file removed: {cache_file} ({e})")
+        os.remove(cache_file)
+        return None
+
+def _write_json_cache(cache_file: str, data) -> None:
+    """
+    Writes data to a compact JSON cache file atomically, using orjson.
+    
+    The data is written to a temporary file which then replaces the cache file,
+    so a crash never leaves a partially written cache behind.
+    
+    Args:
+        cache_file (str): Path to the cache file.
+        data: JSON-serializable data to cache.
+    """
+    content = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    _write_file_atomically(cache_file, lambda file: file.write(content))
+
+def _write_file_atomically(path: str, write) -> None:
+    """
+    Writes a file through a temporary file which then replaces it.
+    
+    The temporary file has a unique name, so concurrent writers of the same path
+    (e.g. metadata prefetch threads) never share it, and it is removed on error.
+    
+    Args:
+        path (str): Path of the file to write.
+        write: Function writing the content to the binary file object it is given.
+    """
+    with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".",
+                                     suffix=".tmp", delete=False) as file:
+        try:
+            write(file)
+        except BaseException:
+            file.close()
+            os.remove(file.name)
+            raise
+    os.replace(file.name, path)
+
+# Shared HTTP session: keeps the connection to the music API alive between requests
+_SESSION = requests.Session()
+_SESSION.headers["Accept-Encoding"] = "gzip"
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=2))
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=2))
+API_TIMEOUT = 10
+# Buffer size used to stream downloads to disk
+DOWNLOAD_BUFFER_SIZE = 256 * 1024
+
+def download_file(url: str, full_path: str) -> bool:
+    """
+    Downloads a file (e.g. a cover image) with the shared HTTP session.
+    
+    The body is streamed to a temporary file with large reads, which then replaces
+    full_path, and the connection is kept alive for the next download.
+    
+    Args:
+        url (str): URL of the file.
+        full_path (str): Path where the file is written.
+        
+    Returns:
+        bool: True if the file was downloaded, False otherwise.
+    """
+    with _SESSION.get(url, stream=True, timeout=API_TIMEOUT) as response:
+        if response.status_code != 200:
+            logger.warning(f"Unable to download file: {url}")
+            return False
+        # Let urllib3 decompress the body, then copy it without a Python chunk loop.
+        # An interrupted download never leaves a truncated file at full_path.
+        response.raw.decode_content = True
+        _write_file_atomically(full_path, lambda file: shutil.copyfileobj(response.raw, file, length=DOWNLOAD_BUFFER_SIZE))
+    return True
+
+def _cache_cover(cover_url: str, album_id: str) -> str:
+    """
+    Downloads an album cover into the cache folder, once per album.
+    
+    Songs from the same album then share the cached image instead of fetching it again.
+    
+    Args:
+        cover_url (str): URL of the cover image.
+        album_id (str): Album identifier, used to name the cached file.
+        
+    Returns:
+        str: Path to the cached cover, or None if there is no cover or the download failed.
+    """
+    if not cover_url:
+        return None
+    cover_path = os.path.join(CACHE_FOLDER, f"cover_{album_id}.jpg")
+    if os.path.exists(cover_path):
+        return cover_path
+    logger.debug(f"Downloading album cover: {cover_url}")
+    # The cover is optional: a network error must not prevent getting the music info
+    try:
+        response = _SESSION.get(cover_url, timeout=API_TIMEOUT)
+    except requests.RequestException as e:
+        logger.warning(f"Unable to download album cover: {cover_url} ({e})")
+        return None
+    if response.status_code != 200:
+        logger.warning(f"Unable to download album cover: {cover_url}")
+        return None
+    _write_file_atomically(cover_path, lambda file: file.write(response.content))
+    return cover_path
+
 def _get_album_(album_id: str, id: str = "") -> dict:
     """
     Retrieves album information from an external API and caches the result.
@@ -204,14 +464,13 @@ def _get_album_(album_id: str, id: str = "") -> dict:
         return None
     os.makedirs(CACHE_FOLDER, exist_ok=True)
     cache_file = os.path.join(CACHE_FOLDER, f"album_{id}.json")
-    if os.path.exists(cache_file):
+    cached = _read_json_cache(cache_file)
+    if cached is not None:
         logger.debug(f"Loading album information from cache: {album_id}")
-        with open(cache_file, "r", encoding="utf-8") as file:
-            return json.load(file)
+        return cached
     logger.debug(f"Searching album information for ID {album_id}")
     url = f"{API_BASE}/album.php?m={album_id}"
-    headers = {}
-    response = requests.get(url, headers=headers)
+    response = _SESSION.get(url, timeout=API_TIMEOUT)
     data = response.json()
     if data.get("album") is None:
         logger.debug(f"No album found for ID {album_id}.")
@@ -223,10 +482,10 @@ def _get_album_(album_id: str, id: str = "") -> dict:
         "cover": album_data.get("strAlbumThumb"),
         "genre": album_data.get("strGenre"),
         "release_year": album_data.get("intYearReleased"),
-        "language": album_data.get("strLocation")
+        "language": album_data.get("strLocation"),
+        "cover_local": _cache_cover(album_data.get("strAlbumThumb"), album_id)
     }
-    with open(cache_file, "w", encoding="utf-8") as file:
-        json.dump(album_info, file, ensure_ascii=False, indent=4)
+    _write_json_cache(cache_file, album_info)
     return album_info
 
 def get_music_info(artist: str, title: str, id: str = "") -> dict:
@@ -256,20 +515,20 @@ def get_music_info(artist: str, title: str, id: str = "") -> dict:
             "decade": None,
             "language": None,
             "cover": None,
+            "cover_local": None,
             "description": None
         }
         
     os.makedirs(CACHE_FOLDER, exist_ok=True)
     cache_key = f"song_{id}"
     cache_file = os.path.join(CACHE_FOLDER, f"{cache_key}.json")
-    if os.path.exists(cache_file):
+    cached = _read_json_cache(cache_file)
+    if cached is not None:
         logger.debug(f"Loading music info from cache: {artist} - {title}")
-        with open(cache_file, "r", encoding="utf-8") as file:
-            return json.load(file)
+        return cached
     logger.debug(f"Searching music info for {artist} - {title}")
     url = f"{API_BASE}searchtrack.php?s={artist}&t={title}"
-    headers = {}
-    response = requests.get(url, headers=headers)
+    response = _SESSION.get(url, timeout=API_TIMEOUT)
     data = response.json()
     result = {}
     if data.get("track") is None:
@@ -283,6 +542,7 @@ def get_music_info(artist: str, title: str, id: str = "") -> dict:
             "decade": None,
             "language": None,
             "cover": None,
+            "cover_local": None,
             "description": None
         }
     else:
@@ -304,15 +564,49 @@ def get_music_info(artist: str, title: str, id: str = "") -> dict:
             "decade": decade,
             "language": album.get("language") if album else None,
             "cover": album.get("cover") if album else None,
+            "cover_local": album.get("cover_local") if album else None,
             "description": track.get("strDescriptionEN")
         }
-    with open(cache_file, "w", encoding="utf-8") as file:
-        json.dump(result, file, ensure_ascii=False, indent=4)
+    _write_json_cache(cache_file, result)
     return result
 
 # =============================================================================
 # Transcription Functions using WhisperX
 # =============================================================================
+# WhisperX models loaded in this process, reused across songs in batch mode
+_MODEL_CACHE = {}
+
+def _get_whisper_model(model: str, language: str = None):
+    """
+    Returns the WhisperX transcription model, loading it only on first use.
+    
+    Models are cached by (model, language, compute type, device).
+    """
+    key = ("transcribe", model, language, WHISPER_COMPUTE_TYPE, WHISPER_DEVICE)
+    if key not in _MODEL_CACHE:
+        if language:
+            logger.debug("Chargement du modèle avec la langue spécifiée : " + language)
+            _MODEL_CACHE[key] = whisperx.load_model(model, device=WHISPER_DEVICE, compute_type=WHISPER_COMPUTE_TYPE, language=language)
+        else:
+            logger.debug("Chargement du modèle principal...")
+            _MODEL_CACHE[key] = whisperx.load_model(model, device=WHISPER_DEVICE, compute_type=WHISPER_COMPUTE_TYPE)
+    else:
+        logger.debug("Modèle principal déjà chargé, réutilisation.")
+    return _MODEL_CACHE[key]
+
+def _get_align_model(language: str):
+    """
+    Returns the WhisperX alignment model and its metadata, loading them only on first use.
+    
+    Alignment models are cached by (language, device).
+    """
+    key = ("align", language, WHISPER_DEVICE)
+    if key not in _MODEL_CACHE:
+        _MODEL_CACHE[key] = whisperx.load_align_model(language_code=language, device=WHISPER_DEVICE)
+    else:
+        logger.debug("Modèle d'alignement déjà chargé, réutilisation.")
+    return _MODEL_CACHE[key]
+
 def transcribe_audio(mp3_path, artist, title, id, model=WHISPER_MODEL, batch_size=WHISPER_BATCH_SIZE, align=WHISPER_ALIGN, language=None):
     """
     Transcribes the given audio file (mp3) into timed words using the WhisperX model.
@@ -334,26 +628,28 @@ def transcribe_audio(mp3_path, artist, title, id, model=WHISPER_MODEL, batch_siz
         language (str): Language code (if known).
         
     Returns:
-        tuple: A tuple containing the list of word segments (srtWords) and the detected language.
+        tuple: A tuple containing the word segments and the detected language.
+               The word segments are stored as parallel arrays (starts, ends, words):
+               start and end times in seconds (NumPy float64 arrays) and the list of words.
     """
     os.makedirs(CACHE_FOLDER, exist_ok=True)
     cache_key = f"words_{id}"
     cache_file = os.path.join(CACHE_FOLDER, f"{cache_key}.json")
-    if os.path.exists(cache_file):
+    data = _read_json_cache(cache_file)
+    if data is not None:
         logger.debug(f"Chargement de la transcription depuis le cache : {artist} - {title}")
-        with open(cache_file, "r", encoding="utf-8") as file:
-            data = json.load(file)
-            return data["srtWords"], data["detected_language"]
+        if "srtWords" in data:
+            # Older cache format: a list of [start, end, word]
+            srt_words = data["srtWords"]
+            data["starts"] = [w[0] for w in srt_words]
+            data["ends"] = [w[1] for w in srt_words]
+            data["words"] = [w[2] for w in srt_words]
+        words = (np.asarray(data["starts"], dtype=np.float64), np.asarray(data["ends"], dtype=np.float64), data["words"])
+        return words, data["detected_language"]
     try:
         logger.debug("Chargement du modèle WhisperX...")
-        # Load the WhisperX model; if a language is specified, pass it as a parameter.
-        if language:
-            # switch model to large
-            logger.debug("Chargement du modèle avec la langue spécifiée : " + language)
-            model_instance = whisperx.load_model(model, device=WHISPER_DEVICE, compute_type=WHISPER_COMPUTE_TYPE, language=language)
-        else:
-            logger.debug("Chargement du modèle principal...")
-            model_instance = whisperx.load_model(model, device=WHISPER_DEVICE, compute_type=WHISPER_COMPUTE_TYPE)
+        # Load the WhisperX model (or reuse it); if a language is specified, pass it as a parameter.
+        model_instance = _get_whisper_model(model, language)
         
         logger.debug("Modèle principal chargé.")
         logger.debug("Chargement de l'audio : " + mp3_path)
@@ -363,33 +659,37 @@ def transcribe_audio(mp3_path, artist, title, id, model=WHISPER_MODEL, batch_siz
         logger.debug("Transcription initiale réalisée.")
         detected_language = result["language"] if language is None else language
         # Load alignment model for WhisperX to get precise word timings.
-        model_a, metadata = whisperx.load_align_model(language_code=detected_language, device=WHISPER_DEVICE)
+        model_a, metadata = _get_align_model(detected_language)
         logger.debug("Modèle d'alignement chargé.")
         result_aligned = whisperx.align(result["segments"], model_a, metadata, audio, WHISPER_DEVICE, return_char_alignments=False)
         logger.debug("Alignement réalisé.")
-        srtWords = []
+        starts = []
+        ends = []
+        texts = []
         # Process each word segment, ensuring that start, end, and word are valid.
         for seg in result_aligned["word_segments"]:
             if seg.get("start") is None or seg.get("end") is None or seg.get("word") is None:
-                logger.debug("Segment vide détecté : " + str(seg))
+                logger.debug("Segment vide détecté : %s", seg)
                 continue
             word = str(seg["word"])
             if not word:
-                logger.debug("Mot vide détecté : " + str(seg))
+                logger.debug("Mot vide détecté : %s", seg)
                 continue
             start = seg["start"]
             end = seg["end"]
-            logger.debug(f"Segment trouvé : {start} - {end} - {word}")
-            srtWords.append([start, end, word])
+            logger.debug("Segment trouvé : %s - %s - %s", start, end, word)
+            starts.append(start)
+            ends.append(end)
+            texts.append(word)
         logger.debug("Segments de mots générés.")
-        with open(cache_file, "w", encoding="utf-8") as file:
-            json.dump({"srtWords": srtWords, "detected_language": detected_language}, file, ensure_ascii=False, indent=4)
-        return srtWords, detected_language
+        words = (np.asarray(starts, dtype=np.float64), np.asarray(ends, dtype=np.float64), texts)
+        _write_json_cache(cache_file, {"starts": words[0], "ends": words[1], "words": texts, "detected_language": detected_language})
+        return words, detected_language
     except Exception as e:
         logger.error("Erreur lors de la transcription avec WhisperX : " + str(e))
         logger.error("Modele : " + model)
         logger.error("Batch size : " + str(batch_size))
         logger.error("Alignement : " + str(align))
         logger.error("Langue : " + str(language))
-        return [], None
+        return (np.empty(0), np.empty(0), []), None
         
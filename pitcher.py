@@ -1,18 +1,71 @@
 import os
-import json
+import tempfile
+import zipfile
+from dataclasses import asdict, dataclass
+from functools import lru_cache
 import numpy as np
-from pydub import AudioSegment  # Used to convert MP3 files to WAV format
-import crepe  # CREPE is used for pitch estimation from audio signals
-from scipy.io import wavfile  # Used to read WAV files
-from config import CACHE_FOLDER
+import orjson
+from pydub import AudioSegment  # Used to decode MP3 files to raw samples
+from config import CACHE_FOLDER, PITCH_BACKEND, logger
+
+# Sample rate expected by CREPE and SwiftF0: the audio is decoded directly at this rate
+PITCH_SAMPLE_RATE = 16000
+# Duration of the audio blocks given to CREPE, in seconds
+PITCH_BLOCK_SECONDS = 30
+# Number of TensorFlow threads (inside and between operations) of each pitch worker process in batch mode
+PITCH_WORKER_THREADS = 2
+# Suffix of the cache files, so caches built by different pitch backends do not mix
+CACHE_SUFFIX = "" if PITCH_BACKEND == "crepe" else f"_{PITCH_BACKEND}"
+
+# =============================================================================
+# Pitch Estimation Function
+# =============================================================================
+def _estimate_pitch(audio_data, sample_rate):
+    """
+    Estimates the pitch of the audio with the backend selected by PITCH_BACKEND.
+    
+    - "crepe": CREPE neural network with Viterbi smoothing (default).
+    - "swiftf0": SwiftF0, a much faster estimator on CPU (requires the swift-f0 package).
+    
+    Args:
+        audio_data (np.ndarray): Mono audio samples.
+        sample_rate (int): Sample rate of the audio in Hz.
+        
+    Returns:
+        tuple: Two NumPy arrays, the frame times (in seconds) and the frequencies (in Hz).
+    """
+    # The backends are imported here: only the selected one is loaded (CREPE loads TensorFlow)
+    if PITCH_BACKEND == "swiftf0":
+        try:
+            from swift_f0 import SwiftF0
+        except ImportError as e:
+            raise ImportError("PITCH_BACKEND=swiftf0 requires the optional swift-f0 package (pip install swift-f0)") from e
+        result = SwiftF0().detect_from_array(audio_data, sample_rate)
+        return np.asarray(result.timestamps), np.asarray(result.pitch_hz)
+    import crepe  # CREPE is used for pitch estimation from audio signals
+    # Use CREPE to predict pitch on blocks of about PITCH_BLOCK_SECONDS, so the activation
+    # matrix of the whole song is never held in memory. crepe.predict returns time values,
+    # frequency values, a confidence score and an activation signal: only the first two are kept.
+    block_size = PITCH_BLOCK_SECONDS * sample_rate
+    n_blocks = max(1, int(np.ceil(len(audio_data) / block_size)))
+    time_blocks = []
+    freq_blocks = []
+    offset = 0
+    for block in np.array_split(audio_data, n_blocks):
+        time_vals, freq_vals, _, _ = crepe.predict(block, sample_rate, viterbi=True, verbose=0)
+        time_blocks.append(np.asarray(time_vals) + offset / sample_rate)
+        freq_blocks.append(np.asarray(freq_vals))
+        offset += len(block)
+    return np.concatenate(time_blocks), np.concatenate(freq_blocks)
 
 # =============================================================================
 # Pitch Cache Creation Function
 # =============================================================================
 def _create_pitch_cache(mp3_file, cache_id):
     """
-    Converts the given MP3 file into a WAV file, then estimates the pitch over the entire 
-    duration using CREPE. The result is cached as a JSON file (averaging the pitch per second).
+    Decodes the given MP3 file to mono samples in memory, then estimates the pitch over the entire 
+    duration using CREPE (or SwiftF0, see PITCH_BACKEND). The result is cached as a NumPy .npz
+    file (averaging the pitch per second).
     
     UltraStar Rule Reference:
       - In UltraStar files, each note has an associated pitch (an integer representing the 
@@ -24,63 +77,70 @@ def _create_pitch_cache(mp3_file, cache_id):
         cache_id (str): A unique identifier for caching purposes.
         
     Returns:
-        list: A list of dictionaries. Each dictionary represents one second of audio with keys:
-              "start": beginning of the second (in seconds),
-              "end": end of the second,
-              "frequency": average frequency (in Hz) detected for that second.
+        np.ndarray: The average frequency (in Hz) detected for each second of audio,
+                    indexed by second (index 0 covers [0, 1[, index 1 covers [1, 2[, ...).
     """
     # Build the path for the cache file for pitch information.
-    crepe_cache_path = os.path.join(CACHE_FOLDER, f"crepe_{cache_id}.json")
-    
-    # If the cache file already exists, load and return it.
-    if os.path.exists(crepe_cache_path):
-        with open(crepe_cache_path, "r") as f:
-            pitch_cache = json.load(f)
-        return pitch_cache
-    else:
-        # Create a WAV version of the MP3. UltraStar timing and pitch processing typically 
-        # require a WAV file for accurate analysis.
-        wav_file = mp3_file.replace(".mp3", ".wav")
-        audio_segment = AudioSegment.from_mp3(mp3_file)
-        audio_segment.export(wav_file, format="wav")
-        
-        # Read the WAV file: sample_rate is in Hz, audio_data is a NumPy array.
-        sample_rate, audio_data = wavfile.read(wav_file)
-        # Use CREPE to predict pitch. The function returns time values, frequency values,
-        # a confidence score, and an activation signal.
-        time_vals, freq_vals, confidence, activation = crepe.predict(audio_data, sample_rate, viterbi=True)
-        time_vals = np.array(time_vals)
-        freq_vals = np.array(freq_vals)
-        
-        # Determine total duration in whole seconds (rounding up).
-        total_seconds = int(np.ceil(time_vals[-1]))
-        pitch_cache = []
-        
-        # For each second, compute the average frequency detected.
-        for sec in range(total_seconds):
-            indices = np.where((time_vals >= sec) & (time_vals < sec + 1))[0]
-            if indices.size > 0:
-                avg_freq = float(np.mean(freq_vals[indices]))
-            else:
-                avg_freq = 0.0
-            pitch_cache.append({
-                "start": sec,
-                "end": sec + 1,
-                "frequency": avg_freq
-            })
-        
-        # Save the cache to a JSON file for later use.
-        with open(crepe_cache_path, "w") as f:
-            json.dump(pitch_cache, f)
-        
-        return pitch_cache
+    # "v2" caches hold only the per-second frequencies; older formats are simply recomputed.
+    crepe_cache_path = os.path.join(CACHE_FOLDER, f"crepe_v2_{cache_id}{CACHE_SUFFIX}.npz")
+    
+    # If the cache file already exists, load and return it (a single open, no separate existence check).
+    # A corrupt file is treated as a cache miss: it is removed and the pitch is computed again.
+    try:
+        with np.load(crepe_cache_path) as data:
+            return data["freq"]
+    except FileNotFoundError:
+        pass
+    except (zipfile.BadZipFile, EOFError, ValueError, KeyError, OSError) as e:
+        logger.warning(f"Corrupt pitch cache removed: {crepe_cache_path} ({e})")
+        os.remove(crepe_cache_path)
+    
+    # Decode the MP3 in memory to 16-bit mono PCM at CREPE's native sample rate,
+    # without writing a temporary WAV file.
+    audio_segment = AudioSegment.from_mp3(mp3_file).set_channels(1).set_frame_rate(PITCH_SAMPLE_RATE).set_sample_width(2)
+    sample_rate = PITCH_SAMPLE_RATE
+    # audio_data is a NumPy array of float samples in [-1, 1].
+    audio_data = np.frombuffer(audio_segment.raw_data, dtype=np.int16).astype(np.float32) / 32768.0
+    time_vals, freq_vals = _estimate_pitch(audio_data, sample_rate)
+    
+    # Determine total duration in whole seconds (rounding up).
+    total_seconds = int(np.ceil(time_vals[-1]))
+    
+    # For each second, compute the average frequency detected: frames are bucketed by
+    # their whole second, then summed and counted per bucket in a single pass.
+    sec_idx = time_vals.astype(np.int64)
+    in_range = sec_idx < total_seconds
+    sums = np.bincount(sec_idx[in_range], weights=freq_vals[in_range], minlength=total_seconds)
+    counts = np.bincount(sec_idx[in_range], minlength=total_seconds)
+    avg_freqs = np.where(counts > 0, sums / np.maximum(counts, 1), 0.0)
+    
+    # Save the cache to a binary .npz file for later use. In batch mode, the pitch workers
+    # may run before anything else has created the cache folder.
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    # Written to a uniquely named temporary file first, which then replaces the cache:
+    # an interrupted worker never leaves a truncated cache behind.
+    with tempfile.NamedTemporaryFile(dir=CACHE_FOLDER, prefix=os.path.basename(crepe_cache_path) + ".",
+                                     suffix=".tmp", delete=False) as file:
+        try:
+            np.savez(file, freq=avg_freqs)
+        except BaseException:
+            file.close()
+            os.remove(file.name)
+            raise
+    os.replace(file.name, crepe_cache_path)
+    
+    return avg_freqs
 
 # =============================================================================
 # Frequency to Ultrastar Pitch Conversion Function
 # =============================================================================
-def _convert_frequency_to_ultrastar(frequency):
+# Lower frequency boundary of each UltraStar pitch from -60 to 67: a frequency rounds
+# to pitch p when it lies half a semitone or less around 261.63 * 2 ** (p / 12).
+_PITCH_BOUNDARIES = 261.63 * 2 ** ((np.arange(-60, 68) - 0.5) / 12)
+
+def _convert_frequencies_to_ultrastar(frequencies):
     """
-    Converts a given frequency in Hertz to the corresponding UltraStar pitch.
+    Converts an array of frequencies in Hertz to the corresponding UltraStar pitches.
     
     UltraStar's pitch rule:
       - The pitch is represented as an integer number of semitones relative to C4 (which is 261.63 Hz).
@@ -88,20 +148,42 @@ def _convert_frequency_to_ultrastar(frequency):
             ultrastar_pitch = round(12 * log2(frequency / 261.63))
       - The result is then clamped to the interval [-60, 67] to adhere to UltraStar specifications.
     
+    No logarithm is computed: each frequency is located among the precomputed
+    pitch boundaries (_PITCH_BOUNDARIES).
+    
+    Frequencies that are zero or negative (no pitch detected) give a pitch of 0.
+    
     Args:
-        frequency (float): Frequency in Hertz.
+        frequencies (np.ndarray): Frequencies in Hertz.
         
     Returns:
-        int: The corresponding UltraStar pitch.
-    """
-    if frequency <= 0:
-        return 0
-    ratio = frequency / 261.63  # Ratio relative to middle C (C4)
-    semitones = 12 * np.log2(ratio)  # Calculate semitones difference using log base 2
-    ultrastar_pitch = int(round(semitones))
-    # Clamp the pitch to the allowed range as per UltraStar rules.
-    ultrastar_pitch = max(-60, min(ultrastar_pitch, 67))
-    return ultrastar_pitch
+        np.ndarray: The corresponding UltraStar pitches (int32), clamped to [-60, 67].
+    """
+    pitches = np.zeros(len(frequencies), dtype=np.int32)
+    detected = frequencies > 0
+    # Pitch p covers [boundary(p - 0.5), boundary(p + 0.5)[, and _PITCH_BOUNDARIES[0] is the lower boundary of -60.
+    indices = np.searchsorted(_PITCH_BOUNDARIES, frequencies[detected], side="right")
+    pitches[detected] = np.clip(indices - 61, -60, 67).astype(np.int32)
+    return pitches
+
+# =============================================================================
+# Data Classes Definitions
+# =============================================================================
+@dataclass(slots=True, frozen=True)
+class WordPitch:
+    """
+    Data class associating a transcribed word with its UltraStar pitch.
+    
+    Attributes:
+        start (float): Start time of the word (in seconds).
+        end (float): End time of the word (in seconds).
+        word (str): The transcribed word.
+        pitch (int): The UltraStar pitch (half-tones relative to C4).
+    """
+    start: float
+    end: float
+    word: str
+    pitch: int
 
 # =============================================================================
 # Mapping Words to Pitch using the Pitch Cache
@@ -118,45 +200,100 @@ def _map_words_to_pitch(words, pitch_cache):
         offset from C4. This function maps timing information to such a pitch.
     
     Args:
-        words (list or dict): A list of word segments, each segment containing start time, end time, and text.
-        pitch_cache (list): A list of dictionaries with keys "start", "end", and "frequency" (from _create_pitch_cache).
+        words (tuple): Word segments as parallel arrays (starts, ends, words), as returned by transcribe_audio.
+        pitch_cache (np.ndarray): Average frequency per second, indexed by second (from _create_pitch_cache).
     
     Returns:
-        list: A list of dictionaries where each dictionary includes the start time, end time, word text, 
+        list: A list of WordPitch objects with the start time, end time, word text, 
               and its corresponding UltraStar pitch.
     """
-    word_pitch_mapping = []
-    
-    # Check if words is a dict containing "srtWords"; otherwise, assume words is a list.
-    if isinstance(words, dict) and "srtWords" in words:
-        words_list = words["srtWords"]
-    else:
-        words_list = words
-    
-    # Build a lookup dictionary for pitch: key is the starting second, value is the frequency.
-    pitch_lookup = {entry["start"]: entry["frequency"] for entry in pitch_cache}
-    
-    # For each word segment, determine the pitch.
-    for word_entry in words_list:
-        word_start = word_entry[0]
-        word_end = word_entry[1]
-        word_text = word_entry[2]
-        # Use the integer part of the word's start time (in seconds) to look up frequency.
-        second = int(word_start)
-        frequency = pitch_lookup.get(second, 0.0)
-        ultrastar_pitch = _convert_frequency_to_ultrastar(frequency)
-        word_pitch_mapping.append({
-            "start": word_start,
-            "end": word_end,
-            "word": word_text,
-            "pitch": ultrastar_pitch
-        })
-    
-    return word_pitch_mapping
+    starts, ends, texts = words
+    
+    # The pitch cache is the lookup array itself: the index is the second, the value is the frequency.
+    pitch_lookup = pitch_cache
+    
+    # Use the integer part of each word's start time (in seconds) to look up frequency
+    # (0.0 outside of the cached seconds), then convert all the frequencies to pitches at once.
+    seconds = starts.astype(np.int64)
+    in_range = (seconds >= 0) & (seconds < len(pitch_lookup))
+    frequencies = np.zeros(len(seconds), dtype=np.float64)
+    frequencies[in_range] = pitch_lookup[seconds[in_range]]
+    pitches = _convert_frequencies_to_ultrastar(frequencies)
+    
+    # For each word segment, associate its pitch.
+    return [
+        WordPitch(word_start, word_end, word_text, ultrastar_pitch)
+        for word_start, word_end, word_text, ultrastar_pitch in zip(starts.tolist(), ends.tolist(), texts, pitches.tolist())
+    ]
 
 # =============================================================================
 # Main Pitch Processing Function
 # =============================================================================
+def init_pitch_worker():
+    """
+    Initializer of the processes computing pitch caches in parallel (batch mode).
+    
+    Limits TensorFlow (used by CREPE) to a few threads per process, so that
+    parallel workers do not oversubscribe the CPU cores, and hides the GPUs from
+    it: they are left to WhisperX and Demucs in the parent process.
+    """
+    if PITCH_BACKEND == "crepe":
+        import tensorflow as tf
+        tf.config.set_visible_devices([], "GPU")
+        tf.config.threading.set_intra_op_parallelism_threads(PITCH_WORKER_THREADS)
+        tf.config.threading.set_inter_op_parallelism_threads(PITCH_WORKER_THREADS)
+
+def word_pitch_cache_path(cache_id):
+    """
+    Returns the path of the cached word-to-pitch mapping of a song.
+    
+    When this file exists, process_pitch returns it without reading the pitch cache.
+    
+    Args:
+        cache_id (str): Unique identifier for caching.
+        
+    Returns:
+        str: Path to the pitch_<id>.json cache file.
+    """
+    return os.path.join(CACHE_FOLDER, f"pitch_{cache_id}{CACHE_SUFFIX}.json")
+
+def prepare_pitch_cache(mp3_file, cache_id):
+    """
+    Computes the per-second pitch cache of a song ahead of process_pitch.
+    
+    Meant to run in a separate process: the cache written on disk is then
+    loaded by process_pitch instead of running the pitch detection again.
+    
+    Args:
+        mp3_file (str): Path to the audio file to analyse (vocals if separated).
+        cache_id (str): Unique identifier for caching.
+    """
+    _create_pitch_cache(mp3_file, cache_id)
+
+def _load_word_pitch_mapping(pitch_cache_path):
+    """
+    Loads a cached word-to-pitch mapping, keeping it in memory for later calls
+    in the same process. Raises FileNotFoundError if the cache does not exist.
+    
+    The in-memory copy is keyed by the modification time of the file, so a
+    regenerated cache is read again (e.g. in the persistent GUI worker).
+    
+    Args:
+        pitch_cache_path (str): Path to the pitch_<id>.json cache file.
+        
+    Returns:
+        tuple: The WordPitch objects (immutable, shared between calls).
+    """
+    return _read_word_pitch_mapping(pitch_cache_path, os.path.getmtime(pitch_cache_path))
+
+@lru_cache(maxsize=32)
+def _read_word_pitch_mapping(pitch_cache_path, mtime):
+    """
+    Reads a word-to-pitch mapping cache file, cached by (path, modification time).
+    """
+    with open(pitch_cache_path, "rb") as f:
+        return tuple(WordPitch(**entry) for entry in orjson.loads(f.read()))
+
 def process_pitch(words, mp3_file, cache_id):
     """
     Processes the audio file and associates each transcribed word with its UltraStar pitch.
@@ -173,23 +310,23 @@ def process_pitch(words, mp3_file, cache_id):
         cache_id (str): Unique identifier for caching.
         
     Returns:
-        list: A list of dictionaries with each word's start, end, text, and associated UltraStar pitch.
-    """
-    pitch_cache_path = os.path.join(CACHE_FOLDER, f"pitch_{cache_id}.json")
-    
-    # Check if a pitch mapping cache already exists.
-    if os.path.exists(pitch_cache_path):
-        with open(pitch_cache_path, "r") as f:
-            word_pitch_mapping = json.load(f)
-        return word_pitch_mapping
-    else:
-        # Create the pitch cache (average frequency per second) using CREPE.
-        pitch_cache = _create_pitch_cache(mp3_file, cache_id)
-        # Map the transcribed words to their respective pitch values.
-        word_pitch_mapping = _map_words_to_pitch(words, pitch_cache)
-        
-        # Save the word-to-pitch mapping to cache.
-        with open(pitch_cache_path, "w") as f:
-            json.dump(word_pitch_mapping, f, indent=2)
-        
-        return word_pitch_mapping
+        tuple: The WordPitch objects with each word's start, end, text, and associated UltraStar pitch.
+    """
+    pitch_cache_path = word_pitch_cache_path(cache_id)
+    
+    # Check if a pitch mapping cache already exists (a single open, no separate existence check).
+    try:
+        return _load_word_pitch_mapping(pitch_cache_path)
+    except FileNotFoundError:
+        pass
+    
+    # Create the pitch cache (average frequency per second) using CREPE.
+    pitch_cache = _create_pitch_cache(mp3_file, cache_id)
+    # Map the transcribed words to their respective pitch values.
+    word_pitch_mapping = _map_words_to_pitch(words, pitch_cache)
+    
+    # Save the word-to-pitch mapping to cache (as dictionaries, still readable JSON).
+    with open(pitch_cache_path, "wb") as f:
+        f.write(orjson.dumps([asdict(entry) for entry in word_pitch_mapping], option=orjson.OPT_INDENT_2))
+    
+    return tuple(word_pitch_mapping)
@@ -30,19 +30,20 @@
 # (e.g., French, German, etc.) understand the rules and the implementation.
 # =============================================================================
 
-from decimal import Decimal
 import hashlib
+import io
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from tkinter import Image
-import requests
+from functools import lru_cache
+from PIL import Image
+import numpy as np
 from config import FRACTION, GAP_THRESHOLD, MAX_WORDS_PER_PHRASE, SPLEETER, SPLEETER_MODEL, logger, OUTPUT_FOLDER, debug, IMG_TARGET_HEIGHT, IMG_TARGET_WIDTH
-from mp3 import detect_bpm, extract_image, read_tags, save_image, spleet, get_music_info, transcribe_audio, get_duration
+from mp3 import download_file, extract_image, read_tags, save_image, separated_stems_folder, spleet, spleet_output_folder, get_music_info, transcribe_audio, get_audio_metadata
 from pitcher import process_pitch
 import random
 
-
 # =============================================================================
 # Data Classes Definitions
 # =============================================================================
@@ -63,7 +64,7 @@ class FileInfo:
     full_path: str       # Full path including directory and file name
     file_name: str       # File name only
 
-@dataclass
+@dataclass(slots=True)
 class Lyric:
     """
     Data class representing a single lyric line (note) in the UltraStar file.
@@ -81,6 +82,13 @@ class Lyric:
     pitch: int
     text: str
 
+def generate_unique_id(artist: str, title: str) -> str:
+    """
+    Returns the SHA256 of "artist - title", used as the song ID for files and caches.
+    """
+    uid = f"{artist} - {title}"
+    return hashlib.sha256(uid.encode()).hexdigest()
+
 # =============================================================================
 # Song Class to encapsulate song data and file infos
 # =============================================================================
@@ -106,14 +114,19 @@ class Song:
         self.output_folder = self._create_output_folder()
         self.file_info_dict = self._generate_file_info_dict()
         self.spleeter_folder = ""
+        self.spleeter_vocals_path = ""  # Stems written by Demucs in spleeter_folder
+        self.spleeter_instrumental_path = ""
         self.file_to_transcribe = ""
         self.words = None
         self.lyrics = []  # Will be a list of Lyric objects
+        self.note_count = 0  # Notes (":" or "*") created so far in self.lyrics
+        self.golden_count = 0  # Golden notes ("*") created so far
+        self.golden_streak = 0  # Golden notes in a row at the end of self.lyrics
         self.ultrastar_header = []  # List to hold header lines for the UltraStar file
         self.bpm = 0
         self.duration = 0
         self.gap = 0
-        self.pitchs = []  # List to hold pitch information (dictionaries with start, end, pitch)
+        self.pitchs = ()  # Pitch information (WordPitch objects with start, end, word, pitch)
         
         # Retrieve additional music info such as album, genre, etc.
         result = get_music_info(artist, title, self.unique_id)
@@ -123,6 +136,7 @@ class Song:
         self.decade = result.get("decade")
         self.language = result.get("language")
         self.cover = result.get("cover")
+        self.cover_file = result.get("cover_local")  # Cover already downloaded in the cache, if any
         self.description = result.get("description")
         self.local_cover = ""
     
@@ -134,10 +148,7 @@ class Song:
         This UID is later used to name files and folders consistently.
         """
         logger.debug(f"Generating unique id for: {self.artist} - {self.title}")
-        uid = f"{self.artist} - {self.title}"
-        sha256 = hashlib.sha256()
-        sha256.update(uid.encode())
-        return sha256.hexdigest()
+        return generate_unique_id(self.artist, self.title)
     
     def _create_output_folder(self) -> str:
         """
@@ -163,14 +174,16 @@ class Song:
         corresponding FileInfo, which includes paths and file names.
         """
         uid = self.unique_id
+        # All files live in the output folder: build the common prefix once
+        base = self.output_folder + os.sep
         file_info_list = [
-            FileInfo(1, "WIP_IMG", os.path.join(self.output_folder, f"WIP_{uid}.jpg"), ""),
-            FileInfo(2, "WIP_SUBTITLE", os.path.join(self.output_folder, f"{uid}.srt"), f"{uid}.srt"),
-            FileInfo(101, "MP3", os.path.join(self.output_folder, f"{uid}.mp3"), f"{uid}.mp3"),
-            FileInfo(121, "VOCALS", os.path.join(self.output_folder, f"{uid} [VOC].mp3"), f"{uid} [VOC].mp3"),
-            FileInfo(122, "INSTRUMENTAL", os.path.join(self.output_folder, f"{uid} [INSTR].mp3"), f"{uid} [INSTR].mp3"),
-            FileInfo(131, "COVER", os.path.join(self.output_folder, f"{uid} [CO].jpg"), f"{uid} [CO].jpg"),
-            FileInfo(132, "BACKGROUND", os.path.join(self.output_folder, f"{uid} [BG].jpg"), f"{uid} [BG].jpg"),
+            FileInfo(1, "WIP_IMG", f"{base}WIP_{uid}.jpg", ""),
+            FileInfo(2, "WIP_SUBTITLE", f"{base}{uid}.srt", f"{uid}.srt"),
+            FileInfo(101, "MP3", f"{base}{uid}.mp3", f"{uid}.mp3"),
+            FileInfo(121, "VOCALS", f"{base}{uid} [VOC].mp3", f"{uid} [VOC].mp3"),
+            FileInfo(122, "INSTRUMENTAL", f"{base}{uid} [INSTR].mp3", f"{uid} [INSTR].mp3"),
+            FileInfo(131, "COVER", f"{base}{uid} [CO].jpg", f"{uid} [CO].jpg"),
+            FileInfo(132, "BACKGROUND", f"{base}{uid} [BG].jpg", f"{uid} [BG].jpg"),
         ]
         info_dict = {fi.file_type: fi for fi in file_info_list}
         return info_dict
@@ -245,7 +258,9 @@ def process_song(mp3_path: str, artist: str = None, title:str = None, language:s
         # If SPLEETER is enabled, separate vocals and instrumental parts.
         if SPLEETER:
             song.spleeter_folder = _separate_vocals_instrumental(song)
-            song.file_to_transcribe = song.spleeter_folder + "/vocals.mp3"
+            song.spleeter_vocals_path = os.path.join(song.spleeter_folder, "vocals.mp3")
+            song.spleeter_instrumental_path = os.path.join(song.spleeter_folder, "no_vocals.mp3")
+            song.file_to_transcribe = song.spleeter_vocals_path
         else:
             logger.debug("Skipping spleeter processing")
             song.spleeter_folder = None
@@ -259,7 +274,7 @@ def process_song(mp3_path: str, artist: str = None, title:str = None, language:s
             logger.debug(f"Transcribing audio with language: {language}")
             words, detected_language = transcribe_audio(song.file_to_transcribe, song.artist, song.title, song.unique_id, language=language)
         
-        if not words:
+        if not words[2]:
             raise ValueError("No words transcribed")
         
         song.words = words
@@ -273,34 +288,20 @@ def process_song(mp3_path: str, artist: str = None, title:str = None, language:s
         
         # Insert end-of-phrase markers based on gaps in lyrics.
         song = _end_of_phrase(song)
-        # Ensure that every lyric has a minimum duration of 1 beat.
-        song = _update_short_lyrics(song)
         lyrics = _lyrics_to_text(song)
 
         ultrastar_file = _create_ultrastar_file(song, lyrics)
         logger.info(f"Ultrastar file created: {ultrastar_file}")
         
-        # remove all .wav files from output folder
-        for file in os.listdir(song.output_folder):
-            if file.lower().endswith(".wav"):
-                _cleanup_file(os.path.join(song.output_folder, file))
-        
         # create a zip from the folder
         shutil.make_archive(song.output_folder, 'zip', song.output_folder)
         logger.info(f"Zip file created: {song.output_folder}.zip")
         
         # Clean up temporary files if not in debug mode.
-        model = ""
         if not debug:
             _cleanup_folder(song.output_folder)
             if SPLEETER:
-                _cleanup_folder(song.spleeter_folder)
-                if debug:
-                    logger.warning(f"model downgrade to 'htdemucs' for spleet")
-                    model = "htdemucs"
-                else:
-                    model = SPLEETER_MODEL                    
-                _cleanup_folder(OUTPUT_FOLDER + "/" + model)
+                _cleanup_spleeter_folders(song)
             _cleanup_folder(song.output_folder)
         
 
@@ -320,28 +321,24 @@ def _create_files(song: Song) -> None:
     
     This function iterates over each file type and calls the corresponding 
     creation function. It then performs file cleanup if necessary.
+    
+    The first file types are I/O bound and independent from each other: they are
+    created in threads, so the cover download overlaps with the audio files.
+    The mp3 copy waits for the WIP image, which writes the cover into the original mp3.
     """
-    creation_functions = {
-        "WIP_IMG": _create_WIP_IMG_file,
-        "WIP_SUBTITLE": _create_WIP_SUBTITLE_file,
-        "MP3": _create_mp3_file,
-        "VOCALS": _create_vocals_file,
-        "INSTRUMENTAL": _create_instrumental_file,
-        "COVER": _create_cover_file,
-        "BACKGROUND": _create_background_file,
-    }
+    concurrent_groups = (("WIP_IMG", "MP3"), ("VOCALS",), ("INSTRUMENTAL",))
+    sequential_types = ("WIP_SUBTITLE", "COVER", "BACKGROUND")
     try:
-        for file_type, create_func in creation_functions.items():
-            if file_type in song.file_info_dict:
-                file_info = song.file_info_dict[file_type]
-                logger.debug(f"Creating file of type {file_type} at {file_info.full_path}")
-                updated_song = create_func(file_info.full_path, song)
-                if updated_song is not None:
-                    song = updated_song
-                else:
-                    logger.warning(f"La fonction {create_func.__name__} a renvoyé None, on conserve l'objet song actuel.")
-            else:
-                logger.error(f"Unknown file type: {file_type}")
+        header_start = len(song.ultrastar_header)
+        with ThreadPoolExecutor(max_workers=len(concurrent_groups)) as executor:
+            futures = [executor.submit(_create_file_group, group, song) for group in concurrent_groups]
+            for future in futures:
+                future.result()
+        # Header lines are appended in completion order: restore the file order.
+        song.ultrastar_header[header_start:] = sorted(
+            song.ultrastar_header[header_start:],
+            key=lambda line: CONCURRENT_HEADER_ORDER.index(line.split(":", 1)[0]))
+        _create_file_group(sequential_types, song)
     except Exception as e:
         logger.error(f"Error creating files: {e}")
         raise
@@ -352,26 +349,40 @@ def _create_files(song: Song) -> None:
             if "WIP" in key:
                 _cleanup_file(file_info.full_path)
         if SPLEETER:
-            _cleanup_folder(song.spleeter_folder)
-            model=""
-            if debug:
-                logger.warning(f"model downgrade to 'htdemucs' for spleet")
-                model = "htdemucs"
-            else:
-                model = SPLEETER_MODEL                    
-            _cleanup_folder(OUTPUT_FOLDER + "/" + model)
-        # delete all wav files from output folder
-        for file in os.listdir(song.output_folder):
-            if file.lower().endswith(".wav"):
-                _cleanup_file(os.path.join(song.output_folder, file))
+            _cleanup_spleeter_folders(song)
     except Exception as e:
         logger.error(f"Error cleaning up files: {e}")
 
+def _create_file_group(file_types: tuple, song: Song) -> Song:
+    """
+    Creates the files of the given types, in order, with their creation functions.
+    """
+    for file_type in file_types:
+        if file_type in song.file_info_dict:
+            create_func = FILE_CREATION_FUNCTIONS[file_type]
+            file_info = song.file_info_dict[file_type]
+            logger.debug(f"Creating file of type {file_type} at {file_info.full_path}")
+            updated_song = create_func(file_info.full_path, song)
+            if updated_song is not None:
+                song = updated_song
+            else:
+                logger.warning(f"La fonction {create_func.__name__} a renvoyé None, on conserve l'objet song actuel.")
+        else:
+            logger.error(f"Unknown file type: {file_type}")
+    return song
+
 def _separate_vocals_instrumental(song: Song) -> str:
     """
     Separates the vocals and instrumental from the original mp3 using the 
     Spleeter tool. Returns the folder where the separated files are stored.
+    
+    If the stems were already separated from this file by spleet_batch in batch
+    mode (see separated_stems_folder), they are reused as is.
     """
+    output = separated_stems_folder(song.mp3_path, SPLEETER_MODEL, OUTPUT_FOLDER)
+    if output:
+        logger.debug(f"Reusing separated stems: {output}")
+        return output
     output = spleet(song.mp3_path, SPLEETER_MODEL, OUTPUT_FOLDER)
     logger.debug(f"Spleet output: {output}")
     return output
@@ -383,8 +394,7 @@ def _update_with_music_info(song: Song) -> Song:
     
     UltraStar files must have at least #TITLE, #ARTIST, #BPM, and #GAP in the header.
     """
-    song.bpm = _get_bpm(song)
-    song.duration = _get_duration(song)
+    song.bpm, song.duration = _get_bpm_and_duration(song)
     song.gap = _get_gap(song)
     
     song = _add_mandatory_headers(song)
@@ -419,11 +429,7 @@ def _add_optional_headers(song: Song) -> Song:
     """
     song.ultrastar_header.append(f"#GAP:{song.gap}")
     
-    user = os.getlogin()
-    if user:
-        song.ultrastar_header.append(f"#CREATOR:{user}")
-    else: 
-        song.ultrastar_header.append("#CREATOR:Ultrastar Generator")
+    song.ultrastar_header.append(f"#CREATOR:{_get_creator()}")
     
     if song.album:
         song.ultrastar_header.append(f"#ALBUM:{song.album}")
@@ -437,6 +443,21 @@ def _add_optional_headers(song: Song) -> Song:
         song.ultrastar_header.append(f"#LANGUAGE:{_convert_language_to_code(song.language)}")
     return song
     
+@lru_cache(maxsize=None)
+def _get_creator() -> str:
+    """
+    Returns the name used for the #CREATOR header: the logged-in user, or
+    "Ultrastar Generator" when there is none (os.getlogin fails without a
+    controlling terminal, e.g. in a daemon or some GUI launches).
+    
+    The result is computed once per process.
+    """
+    try:
+        user = os.getlogin()
+    except OSError:
+        user = None
+    return user if user else "Ultrastar Generator"
+
 def _convert_language_to_code(language: str) -> str:
     """
     Converts a language abbreviation to its full English name.
@@ -465,21 +486,16 @@ def _header_to_string(song: Song) -> str:
     """
     return "\n".join(song.ultrastar_header)
 
-def _get_duration(song: Song) -> int:
+def _get_bpm_and_duration(song: Song) -> tuple:
     """
-    Retrieves the duration of the mp3 file in milliseconds.
-    
-    This value can be used to validate the song length.
-    """
-    return get_duration(song.mp3_path)
-
-def _get_bpm(song: Song) -> int:
-    """
-    Detects the BPM of the mp3 file and multiplies it by 4.
+    Detects the BPM of the mp3 file and retrieves its duration (cached per song).
     
     In older UltraStar formats, the BPM in the file is 4 times the real BPM.
+    The duration can be used to validate the song length.
+    The GAP is not cached: it is derived from the (already cached) transcription.
     """
-    return detect_bpm(song.mp3_path) * 4
+    bpm, duration = get_audio_metadata(song.mp3_path, song.unique_id)
+    return bpm * 4, duration
 
 def _get_gap(song: Song) -> int:
     """
@@ -489,8 +505,9 @@ def _get_gap(song: Song) -> int:
     If transcription data (words) is available, it uses the first timing value.
     """
  
-    if song.words:
-        return int(round(song.words[0][0] * 1000))
+    if song.words and len(song.words[0]):
+        starts = song.words[0]
+        return int(round(starts[0] * 1000))
     return 0
 
 # =============================================================================
@@ -505,24 +522,27 @@ def _create_WIP_IMG_file(full_path: str, song: Song) -> None:
     creates a blank image.
     """
     logger.debug(f"Creating WIP image file: {full_path}")
+    # Image left by a previous run (WIP files are kept in debug mode)
+    if os.path.isfile(full_path) and os.path.getsize(full_path) > 0:
+        logger.debug(f"Using existing WIP image file: {full_path}")
+        song.local_cover = full_path
+        return song
     logger.debug("Trying to extract cover image from mp3 file")
     result = extract_image(song.mp3_path, full_path)
     if not result:
         logger.error("Cover image not found in mp3 file")
-        if song.cover:
-            response = requests.get(song.cover, stream=True)
-            if response.status_code == 200:
-                with open(full_path, "wb") as file:
-                    for chunk in response.iter_content(chunk_size=1024):
-                        if chunk:
-                            file.write(chunk)
+        if song.cover_file and os.path.exists(song.cover_file):
+            logger.debug(f"Using cached cover image: {song.cover_file}")
+            shutil.copyfile(song.cover_file, full_path)
+            logger.debug("Writing cover image to mp3 file")
+            save_image(song.mp3_path, full_path)
+        elif song.cover and download_file(song.cover, full_path):
             logger.debug("Writing cover image to mp3 file")
             save_image(song.mp3_path, full_path)
         else:
             logger.warning("Cover image not found")
             logger.warning("Creating blank image")
-            if not os.path.exists(full_path):
-                _create_blank_image(full_path)
+            _create_blank_image(full_path)
     
     song.local_cover = full_path
     return song
@@ -547,12 +567,9 @@ def _create_ultrastar_file(song: Song, lyrics: str) -> str:
     full_path = os.path.join(song.output_folder, f"{song.unique_id}.txt")
     logger.debug(f"Creating Ultrastar file: {full_path}")
     header = _header_to_string(song)
-    with open(full_path, "w") as file:
-        file.write(header)
-        file.write("\n")
-        logger.debug("Processing lyrics")
-        file.write(lyrics)
-        file.write("\n")
+    # The whole file is written at once, through a buffer large enough to hold it.
+    with open(full_path, "w", buffering=1024 * 1024) as file:
+        file.write(f"{header}\n{lyrics}\n")
     return full_path
 
 def _create_mp3_file(full_path: str, song: Song) -> Song:
@@ -562,7 +579,8 @@ def _create_mp3_file(full_path: str, song: Song) -> Song:
     Also appends the #MP3 and #AUDIO header tags with the file name.
     """
     logger.debug(f"Creating MP3 file: {full_path}")
-    shutil.copy(song.mp3_path, full_path)
+    # copyfile only copies the data, using the OS fast-copy path (e.g. sendfile on Linux)
+    shutil.copyfile(song.mp3_path, full_path)
     song.ultrastar_header.append("#MP3:" + song.file_info_dict["MP3"].file_name)
     song.ultrastar_header.append("#AUDIO:" + song.file_info_dict["MP3"].file_name)
     return song
@@ -578,13 +596,14 @@ def _create_vocals_file(full_path: str, song: Song) -> Song:
         logger.debug("Skipping vocals file creation")
         return song 
     logger.debug(f"Creating vocals file: {full_path}")
-    source_file = song.spleeter_folder + "/vocals.mp3"
+    source_file = song.spleeter_vocals_path
     song.file_to_transcribe = full_path
-    if os.path.exists(source_file):
-        shutil.move(source_file, full_path)
-    else:
+    # Demucs writes its stems under OUTPUT_FOLDER too: a rename is enough
+    try:
+        os.replace(source_file, full_path)
+    except FileNotFoundError as e:
         logger.error(f"Vocals file not found: {source_file}")
-        raise Exception(f"Vocals file not found: {source_file}")
+        raise Exception(f"Vocals file not found: {source_file}") from e
     song.ultrastar_header.append("#VOCALS:" + song.file_info_dict["VOCALS"].file_name)
     return song
 
@@ -599,12 +618,12 @@ def _create_instrumental_file(full_path: str, song: Song) -> Song:
         logger.debug("Skipping instrumental file creation")
         return song
     logger.debug(f"Creating instrumental file: {full_path}")
-    source_file = song.spleeter_folder + "/no_vocals.mp3"
-    if os.path.exists(source_file):
-        shutil.move(source_file, full_path)
-    else:
+    source_file = song.spleeter_instrumental_path
+    try:
+        os.replace(source_file, full_path)
+    except FileNotFoundError as e:
         logger.error(f"Instrumental file not found: {source_file}")
-        raise Exception(f"Instrumental file not found: {source_file}")
+        raise Exception(f"Instrumental file not found: {source_file}") from e
     song.ultrastar_header.append("#INSTRUMENTAL:" + song.file_info_dict["INSTRUMENTAL"].file_name)
     return song
 
@@ -617,7 +636,7 @@ def _create_cover_file(full_path: str, song: Song) -> Song:
     """
     logger.debug(f"Creating cover file: {full_path}")
     if song.local_cover:
-        shutil.copy(song.local_cover, full_path)
+        shutil.copyfile(song.local_cover, full_path)
     else:
         logger.error("Cover image not found")
         _create_blank_image(full_path)
@@ -628,12 +647,23 @@ def _create_background_file(full_path: str, song: Song) -> Song:
     """
     Creates the background image file.
     
-    Copies the local cover (or background image) to the output folder and updates the header
-    with the #BACKGROUND tag.
+    Links (or copies) the cover file created just before in the output folder and
+    updates the header with the #BACKGROUND tag.
     """
     logger.debug(f"Creating background file: {full_path}")
     if song.local_cover:
-        shutil.copy(song.local_cover, full_path)
+        # Same image as the final cover file: a hard link avoids writing the bytes a
+        # second time. The WIP image is not linked, as it may be rewritten later.
+        cover_path = song.file_info_dict["COVER"].full_path
+        try:
+            os.remove(full_path)  # Left by a previous run (possibly already a link)
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(cover_path, full_path)
+        except OSError:
+            # Other device or file system without hard links
+            shutil.copyfile(cover_path, full_path)
     else:
         logger.error("Background image not found")
         _create_blank_image(full_path)
@@ -645,8 +675,33 @@ def _create_blank_image(full_path: str) -> None:
     Creates a blank image file (black) with the given full path.
     """
     logger.debug(f"Creating blank image file: {full_path}")
+    with open(full_path, "wb") as file:
+        file.write(_blank_image_bytes())
+
+@lru_cache(maxsize=1)
+def _blank_image_bytes() -> bytes:
+    """
+    Returns the JPEG-encoded blank image, encoded only once per process.
+    
+    All the images of the song (WIP, cover and background) are .jpg files.
+    """
+    buffer = io.BytesIO()
     img = Image.new("RGB", (IMG_TARGET_HEIGHT, IMG_TARGET_WIDTH), color="black")
-    img.save(full_path)
+    img.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+# Creation function of each file type of Song.file_info_dict
+FILE_CREATION_FUNCTIONS = {
+    "WIP_IMG": _create_WIP_IMG_file,
+    "WIP_SUBTITLE": _create_WIP_SUBTITLE_file,
+    "MP3": _create_mp3_file,
+    "VOCALS": _create_vocals_file,
+    "INSTRUMENTAL": _create_instrumental_file,
+    "COVER": _create_cover_file,
+    "BACKGROUND": _create_background_file,
+}
+# Header tags added by the files created concurrently, in file order
+CONCURRENT_HEADER_ORDER = ("#MP3", "#AUDIO", "#VOCALS", "#INSTRUMENTAL")
 
 # =============================================================================
 # Helper Functions for File Cleanup
@@ -660,8 +715,23 @@ def _cleanup_file(full_path: str) -> None:
         logger.debug(f"DEBUG MODE: Skipping file cleanup: {full_path}")        
     else:
         logger.debug(f"Cleaning file: {full_path}")
-        if os.path.exists(full_path):
+        try:
             os.remove(full_path)
+        except FileNotFoundError:
+            pass
+
+def _cleanup_spleeter_folders(song: Song) -> None:
+    """
+    Deletes the song's Spleeter output folder, and the model folder once empty.
+    
+    The model folder is shared by all songs separated in the same batch, so it
+    is only removed when no other song's stems remain in it.
+    """
+    if song.spleeter_folder:
+        _cleanup_folder(song.spleeter_folder)
+    model_folder = os.path.dirname(spleet_output_folder(song.mp3_path, SPLEETER_MODEL, OUTPUT_FOLDER))
+    if os.path.isdir(model_folder) and not os.listdir(model_folder):
+        _cleanup_folder(model_folder)
 
 def _cleanup_folder(folder_path: str) -> None:
     """
@@ -675,80 +745,94 @@ def _cleanup_folder(folder_path: str) -> None:
 # Lyrics Processing Functions
 # =============================================================================
 
-def _get_pitch(start: Decimal, end: Decimal, song: Song) -> int:
+def _get_pitches(starts: np.ndarray, song: Song) -> np.ndarray:
     """
-    Determines the pitch for a lyric note based on its start time.
+    Determines the pitch of every lyric note based on its start time.
     
-    The pitch is selected from song.pitchs based on whether the note's start falls
-    within the range defined by a pitch entry.
+    The pitch of a note is the one of the song.pitchs entry whose range contains
+    the note's start (0 if there is none). The entries are sorted by start time, so
+    all the notes are looked up at once with a binary search.
     
     UltraStar rules specify that pitch is expressed as the number of half-tones 
     relative to C4 (C4 = 0).
     """
-    word_start = float(start)
-    for pitch in song.pitchs:
-        if pitch["start"] <= word_start < pitch["end"]:
-            return pitch["pitch"]
-    return 0
+    if not song.pitchs:
+        return np.zeros(len(starts), dtype=np.int64)
+    pitch_starts = np.array([pitch.start for pitch in song.pitchs], dtype=np.float64)
+    pitch_ends = np.array([pitch.end for pitch in song.pitchs], dtype=np.float64)
+    pitch_values = np.array([pitch.pitch for pitch in song.pitchs], dtype=np.int64)
+    # Index of the last entry starting at or before each note
+    index = np.searchsorted(pitch_starts, starts, side="right") - 1
+    found = index >= 0
+    index = np.maximum(index, 0)
+    return np.where(found & (starts < pitch_ends[index]), pitch_values[index], 0)
 
-def _word_to_lyric(start: Decimal, end: Decimal, word: str, song: Song) -> Lyric:
+def _word_to_lyric(word: str, start_beat: int, length: int, pitch: int, song: Song) -> Lyric:
     """
-    Convertit un mot (avec son timing) en objet Lyric en utilisant nos fonctions
-    de conversion pour obtenir le start beat et la durée (length).
+    Convertit un mot en objet Lyric, à partir du start beat, de la durée (length)
+    et du pitch déjà calculés pour tous les mots par _words_to_lyrics.
     """
     note_type = _get_note_type(song)
-    # Convertir les temps en float pour nos fonctions
-    t_start = float(start)
-    t_end = float(end)
-    # Appliquer la conversion avec GAP et BPM extraits du song
-    start_beat, length = _calculate_start_and_length(t_start, t_end, song.gap, song.bpm)
-    
-    pitch = _get_pitch(start, end, song)
+    # Compteurs utilisés par _get_note_type pour la note suivante
+    song.note_count += 1
+    if note_type == "*":
+        song.golden_count += 1
+        song.golden_streak += 1
+    else:
+        song.golden_streak = 0
     
     return Lyric(note_type, start_beat, length, pitch, word)
 
 def _calculate_start_and_length(word_start, word_end, gap, bpm):
     """
     Convertit précisément les timestamps (début et fin) en beats UltraStar.
-    - word_start et word_end sont en secondes.
+    - word_start et word_end sont en secondes (tableaux NumPy : tous les mots sont convertis en une fois).
     - gap est en millisecondes.
     - bpm est le BPM affiché dans le fichier (généralement 4 fois le BPM réel).
     
     La formule utilisée :
        tick = temps (en s) × (BPM × 4 / 60)
+    
+    Les règles UltraStar imposent une durée (length) d'au moins 1 beat par note :
+    elle est appliquée ici, pour tous les mots à la fois.
     """
     ms_per_beat = 60000 / (bpm * 4)  # correction ici : multiplier bpm par 4
-    start_beat = int(round(((word_start * 1000) - gap) / ms_per_beat))
-    end_beat = int(round(((word_end * 1000) - gap) / ms_per_beat))
-    length_in_beats = max(end_beat - start_beat, 1)
+    start_beat = np.round(((word_start * 1000) - gap) / ms_per_beat).astype(np.int64)
+    end_beat = np.round(((word_end * 1000) - gap) / ms_per_beat).astype(np.int64)
+    length_in_beats = np.maximum(end_beat - start_beat, 1)
     return start_beat, length_in_beats
 
 def _words_to_lyrics(song: Song) -> Song:
     """
     Converts transcribed words (from audio transcription) into Lyric objects.
     
-    It iterates over song.words (each element containing a start, end, and text)
-    and creates a corresponding Lyric object using _word_to_lyric.
+    The start beats, lengths and pitches of all the words in song.words (parallel
+    arrays of starts, ends and texts) are computed at once, then a Lyric object is
+    created for each word using _word_to_lyric.
     """
     song.lyrics = []
-    for word in song.words:
-        start = word[0]
-        end = word[1]
-        text = _remove_punctuation(word[2])
-        lyric = _word_to_lyric(start, end, text, song)
+    song.note_count = song.golden_count = song.golden_streak = 0
+    starts, ends, texts = song.words
+    start_beats, lengths = _calculate_start_and_length(starts, ends, song.gap, song.bpm)
+    pitches = _get_pitches(starts, song)
+    for word, start_beat, length, pitch in zip(texts, start_beats.tolist(), lengths.tolist(), pitches.tolist()):
+        text = _remove_punctuation(word)
+        lyric = _word_to_lyric(text, start_beat, length, pitch, song)
         song.lyrics.append(lyric)
-        logger.debug(f"Lyric: {lyric}")
+        logger.debug("Lyric: %s", lyric)
     
     return song
 
+# Translation table deleting the punctuation characters removed from the lyrics
+PUNCTUATION_TABLE = str.maketrans("", "", ".,;:!?\"()[]{}-_–—")
+
 def _remove_punctuation(text: str) -> str:
     """
     Removes punctuation from a given text.
     
     This is used to clean up the text before processing.
     """
-    list_of_punctuation = [".", ",", ";", ":", "!", "?", "\"", "(", ")", "[", "]", "{", "}", "-", "_", "–", "—"]
-    return "".join([char for char in text if char not in list_of_punctuation])
+    return text.translate(PUNCTUATION_TABLE)
 
 def _lyrics_to_text(song: Song) -> str:
     """
@@ -762,16 +846,18 @@ def _lyrics_to_text(song: Song) -> str:
     
     The file is terminated with an "E" on a separate line.
     """
-    lyrics_text = ""
-    for lyric in song.lyrics:
-        if lyric.note_type == "-":
-            # For marker lines, output only the marker and the start beat.
-            lyrics_text += f"{lyric.note_type} {lyric.start_beat}\n"
-        else:
-            # For normal notes, output start_beat, length, pitch and text.
-            lyrics_text += f"{lyric.note_type} {lyric.start_beat} {lyric.length} {lyric.pitch}  {lyric.text}\n"
-    lyrics_text += "E\n"
-    return lyrics_text
+    # Format methods bound once, used for every line of the list joined at the end.
+    # Marker lines only have the marker and the start beat; normal notes also have
+    # the length, pitch and text.
+    format_marker = "{} {}\n".format
+    format_note = "{} {} {} {}  {}\n".format
+    lines = [
+        format_marker(lyric.note_type, lyric.start_beat) if lyric.note_type == "-"
+        else format_note(lyric.note_type, lyric.start_beat, lyric.length, lyric.pitch, lyric.text)
+        for lyric in song.lyrics
+    ]
+    lines.append("E\n")
+    return "".join(lines)
 
 def _end_of_phrase(song: Song) -> Song:
     logger.debug("Inserting end-of-phrase markers")
@@ -784,11 +870,13 @@ def _end_of_phrase(song: Song) -> Song:
     # Compteur du nombre de mots dans la phrase courante
     phrase_word_count = 0
 
-    # Iterate through all lyric lines by their index
-    for i in range(len(song.lyrics)):
-        # Get the current lyric line (an object of type Lyric)
-        line = song.lyrics[i]
-        logger.debug(f"Processing line: {line}")
+    # Local names avoid attribute lookups in the loop
+    lyrics = song.lyrics
+    last_index = len(lyrics) - 1
+    
+    # Iterate through all lyric lines (objects of type Lyric) with their index
+    for i, line in enumerate(lyrics):
+        logger.debug("Processing line: %s", line)
         
         # Check if the current line is a normal note (represented by a colon ":" or golden represented by "*")
         if line.note_type == ":" or line.note_type == "*":
@@ -796,47 +884,47 @@ def _end_of_phrase(song: Song) -> Song:
             new_lyrics.append(line)
             # Calculate the ending beat of this note (start beat + duration in beats)
             note_end = line.start_beat + line.length
-            logger.debug(f"Note end: {note_end}")
+            logger.debug("Note end: %s", note_end)
             
             # Update the current phrase's end:
             # If we haven't set it yet, or if this note ends later than the current phrase end,
             # then update current_phrase_end to the end of this note.
             if current_phrase_end is None or note_end > current_phrase_end:
                 current_phrase_end = note_end
-                logger.debug(f"Current phrase end: {current_phrase_end}")
+                logger.debug("Current phrase end: %s", current_phrase_end)
             
             # Increment the word count for the current phrase
             phrase_word_count += 1
-            logger.debug(f"Phrase word count: {phrase_word_count}")
+            logger.debug("Phrase word count: %s", phrase_word_count)
             
             # Check if the maximum number of words in the phrase is reached
-            if phrase_word_count >= int(MAX_WORDS_PER_PHRASE):
+            if phrase_word_count >= MAX_WORDS_PER_PHRASE:
                 marker_start = current_phrase_end  # Insert marker at the end of the last word
                 end_marker = Lyric("-", marker_start, 0, 0, "")
                 new_lyrics.append(end_marker)
                 logger.debug("----------------- End-of-Phrase Inserted due to max word count -----------------")
-                logger.debug(f"Inserted end-of-phrase marker at beat {marker_start}")
+                logger.debug("Inserted end-of-phrase marker at beat %s", marker_start)
                 # Reset current phrase tracking
                 current_phrase_end = None
                 phrase_word_count = 0
             
             # Check if there is a next lyric line in the list
-            if i < len(song.lyrics) - 1:
+            if i < last_index:
                 # Get the next lyric line
-                next_line = song.lyrics[i + 1]
-                logger.debug(f"Next line: {next_line}")
+                next_line = lyrics[i + 1]
+                logger.debug("Next line: %s", next_line)
                 # Only consider next lines that are normal notes (":" or "*")
                 if next_line.note_type == ":" or next_line.note_type == "*":
                     # Calculate the gap in beats between the current phrase's end and the next note's start
                     gap = next_line.start_beat - current_phrase_end if current_phrase_end is not None else 0
-                    logger.debug(f"Gap: {gap}")
+                    logger.debug("Gap: %s", gap)
                     # If the gap exceeds the threshold, it's considered a phrase break
-                    if gap >= int(GAP_THRESHOLD):
-                        marker_start = current_phrase_end + int(round(gap * Decimal(FRACTION)))
+                    if gap >= GAP_THRESHOLD:
+                        marker_start = current_phrase_end + int(round(gap * FRACTION))
                         end_marker = Lyric("-", marker_start, 0, 0, "")
                         new_lyrics.append(end_marker)
                         logger.debug("----------------- End-of-Phrase Inserted due to gap threshold -----------------")
-                        logger.debug(f"Inserted end-of-phrase marker at beat {marker_start}")
+                        logger.debug("Inserted end-of-phrase marker at beat %s", marker_start)
                         # Reset phrase tracking for the next phrase
                         current_phrase_end = None
                         phrase_word_count = 0
@@ -852,26 +940,6 @@ def _end_of_phrase(song: Song) -> Song:
     # Return the updated Song object
     return song
 
-def _update_short_lyrics(song: Song) -> Song:
-    """
-    Ensures that every lyric has a minimum duration of 1 beat.
-    
-    UltraStar rules require that the 'length' value of a note (duration) must be 
-    at least 1. This function updates any lyric with a length less than 1 to 1.
-    
-    Args:
-        song (Song): Main song object containing the lyrics.
-    
-    Returns:
-        Song: Updated song object with corrected lyric durations.
-    """
-    logger.debug("Updating short lyrics")
-    for i, lyric in enumerate(song.lyrics):
-        if lyric.length < 1 and lyric.note_type != "-":
-            logger.debug(f"Updating short lyric: {lyric}")
-            song.lyrics[i].length = 1
-    return song
-
 
 
 # =============================================================================
@@ -894,7 +962,8 @@ def _get_note_type(song) -> str:
     
     Args:
         song (Song): l'objet Song contenant song.words (la liste complète des mots)
-                      et song.lyrics (les notes déjà traitées).
+                      et les compteurs des notes déjà traitées (note_count,
+                      golden_count, golden_streak).
     Raises:
         ValueError: si start n'est pas strictement inférieur à end.
     
@@ -903,11 +972,11 @@ def _get_note_type(song) -> str:
     """
     
     # On considère que song.words contient la liste complète des notes prévues.
-    total_notes = len(song.words) if song.words else 0
-    # On compte dans song.lyrics les notes déjà créées (on ignore les marqueurs "-" éventuels).
-    processed_notes = [ly for ly in song.lyrics if ly.note_type in [":", "*"]]
-    processed_count = len(processed_notes)
-    golden_count = sum(1 for ly in processed_notes if ly.note_type == "*")
+    total_notes = len(song.words[2]) if song.words else 0
+    # Les notes déjà créées sont comptées au fur et à mesure par _word_to_lyric
+    # (les marqueurs "-" éventuels sont ignorés).
+    processed_count = song.note_count
+    golden_count = song.golden_count
     
     golden_target_ratio = 0.10  # 10% de notes golden
     desired_golden_count = total_notes * golden_target_ratio
@@ -918,7 +987,7 @@ def _get_note_type(song) -> str:
         return ":"
     
     # Si les 3 dernières notes traitées sont déjà golden, on force une note normale.
-    if processed_count >= 3 and all(ly.note_type == "*" for ly in processed_notes[-3:]):
+    if song.golden_streak >= 3:
         return ":"
     
     # Calculer la probabilité d'attribuer une note golden